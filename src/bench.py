@@ -0,0 +1,216 @@
+"""Micro-benchmarks against a local database.
+
+Run from the src directory, e.g. `python bench.py statements --messages 2000`.
+Everything a benchmark writes happens inside a transaction that is rolled back
+at the end, or under a throwaway Redis prefix that is deleted afterwards, so
+it leaves the databases untouched.
+"""
+
+import argparse
+import asyncio
+import secrets
+import time
+from collections.abc import Callable
+from datetime import UTC, datetime
+
+import discord
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def report(name: str, ops: int, seconds: float) -> None:
+    print(
+        f"{name:<24} {ops:>7} ops  {seconds:>7.2f}s  "
+        f"{seconds / ops * 1e6:>8.0f}µs/op  {ops / seconds:>8.0f} ops/s"
+    )
+
+
+def bench_statements(messages: int) -> None:
+    """Compare the Pony entity path with the prepared statement layer.
+
+    Edits go through the same code as the index writer, which also records
+    the edit history, so the comparison is slightly in Pony's favor there.
+    """
+    # imported here so that the environment is loaded before connecting
+    import psycopg2
+    from pony.orm import db_session, rollback
+
+    from utils.index.database import apply_edits, insert_messages
+    from utils.index.models import Mention, Message, Reaction, connection_params, db
+    from utils.index.pool import PreparedConnection
+    from utils.index.statements import (
+        MESSAGE_CHANNEL,
+        REACTION_ADD,
+        REACTION_REMOVE,
+    )
+    from utils.index.utils import EditData, MessageData
+
+    now = datetime.now(UTC)
+    first_id = discord.utils.time_snowflake(now)
+    fixtures = [
+        MessageData(
+            message_id=first_id + i,
+            author_id=1,
+            is_bot=False,
+            channel_id=1,
+            thread_id=None,
+            content=f"benchmark message {i}",
+            timestamp=now,
+            reply_to=None,
+            mentioned_ids=[2, 3],
+            reactions=[],
+        )
+        for i in range(messages)
+    ]
+    ids = [data.message_id for data in fixtures]
+
+    def pony_reaction_add(message_id: int) -> None:
+        msg = Message.get(message_id=message_id)
+        if msg and not Reaction.exists(
+            message=message_id, user_id=4, emoji_id=None, emoji_unicode="👍"
+        ):
+            Reaction(
+                message=message_id,
+                user_id=4,
+                emoji_id=None,
+                emoji_unicode="👍",
+                timestamp=now,
+            )
+
+    def pony_reaction_remove(message_id: int) -> None:
+        msg = Message.get(message_id=message_id)
+        reaction = msg and Reaction.get(
+            message=message_id, user_id=4, emoji_id=None, emoji_unicode="👍"
+        )
+        if reaction:
+            reaction.delete()
+
+    def pony_edit(message_id: int) -> None:
+        msg = Message.get(message_id=message_id)
+        if msg:
+            msg.content = "edited"
+            Mention.select(lambda m: m.message == message_id).delete(bulk=True)
+            for uid in (2, 5):
+                Mention(message=message_id, mentioned_user_id=uid)
+
+    print(f"Pony entities, {messages} messages")
+    with db_session:
+        insert_messages(db.get_connection().cursor(), fixtures)
+
+        for name, op in [
+            ("reaction add", pony_reaction_add),
+            ("reaction remove", pony_reaction_remove),
+            ("edit", pony_edit),
+        ]:
+            start = time.perf_counter()
+            for message_id in ids:
+                op(message_id)
+                db.flush()
+            report(name, messages, time.perf_counter() - start)
+
+        rollback()
+
+    conn = psycopg2.connect(connection_factory=PreparedConnection, **connection_params)
+    try:
+        with conn.cursor() as cursor:
+            insert_messages(cursor, fixtures)
+
+            def reaction_add(message_id: int) -> None:
+                MESSAGE_CHANNEL.execute(cursor, message_id)
+                if cursor.fetchone():
+                    REACTION_ADD.execute(cursor, message_id, 4, None, "👍", now)
+
+            def reaction_remove(message_id: int) -> None:
+                MESSAGE_CHANNEL.execute(cursor, message_id)
+                if cursor.fetchone():
+                    REACTION_REMOVE.execute(cursor, message_id, 4, None, "👍")
+
+            def edit(message_id: int) -> None:
+                apply_edits(cursor, [EditData(message_id, "edited", [2, 5], now)])
+
+            print(f"\nPrepared statements, {messages} messages")
+            operations: list[tuple[str, Callable[[int], None]]] = [
+                ("reaction add", reaction_add),
+                ("reaction remove", reaction_remove),
+                ("edit", edit),
+            ]
+            for name, op in operations:
+                start = time.perf_counter()
+                for message_id in ids:
+                    op(message_id)
+                report(name, messages, time.perf_counter() - start)
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+async def bench_tags(counts: list[int]) -> None:
+    """Compare loading every tag one HGETALL at a time with the pipelined path."""
+    from utils.tags.database import TagDatabase
+    from utils.tags.models import TagData
+
+    db = TagDatabase(key_prefix=f"bench_tag_{secrets.token_hex(4)}")
+    await db.connect()
+    assert db.redis
+
+    print(f"{'tags':>7}  {'sequential':>15}  {'pipelined':>10}  {'speedup':>8}")
+    try:
+        for count in counts:
+            names = [f"tag{i}" for i in range(count)]
+            async with db.redis.pipeline(transaction=False) as pipe:
+                for name in names:
+                    tag = TagData(
+                        name=name,
+                        content="benchmark tag " * 10,
+                        author_id=1,
+                        author_name="bench",
+                        created_at=datetime.now(),
+                    )
+                    pipe.sadd(db.get_set_key(""), name)
+                    pipe.hset(db.get_key(name), mapping=tag.to_hash())  # pyright: ignore[reportArgumentType]
+                await pipe.execute()
+
+            start = time.perf_counter()
+            for name in await db.smembers(""):
+                await db.hgetall(name)
+            sequential = time.perf_counter() - start
+
+            start = time.perf_counter()
+            tags = await db.get_all_tags()
+            bulk = time.perf_counter() - start
+            assert len(tags) == count
+
+            print(
+                f"{count:>7}  {sequential * 1000:>13.1f}ms  {bulk * 1000:>8.1f}ms  "
+                f"{sequential / bulk:>7.1f}x"
+            )
+    finally:
+        keys = [key async for key in db.redis.scan_iter(f"{db.key_prefix}:*")]
+        await db.redis.delete(db.get_set_key(""), *keys)
+        await db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    statements = subparsers.add_parser(
+        "statements", help="Pony entities vs prepared statements for live events"
+    )
+    statements.add_argument("--messages", type=int, default=1000)
+
+    tags = subparsers.add_parser(
+        "tags", help="one request per tag vs pipelined bulk loading of every tag"
+    )
+    tags.add_argument("--counts", type=int, nargs="+", default=[100, 1000, 10000])
+
+    args = parser.parse_args()
+    if args.benchmark == "statements":
+        bench_statements(args.messages)
+    elif args.benchmark == "tags":
+        asyncio.run(bench_tags(args.counts))
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,7 @@ from discord.abc import GuildChannel, PrivateChannel
 from discord.ext import commands
 
 from utils.ids import Meta, Role, eval_whitelist
+from utils.redis import get_redis, redis_pool_stats
 
 
 class RedirectToEmbed(io.StringIO):
@@ -44,6 +45,42 @@ class General(commands.Cog):
         latency = round(self.bot.latency * 1000)
         await ctx.reply(content=f"🏓 pong! took {latency}ms", ephemeral=True)
 
+    @commands.hybrid_command(
+        name="redisstatus", description="Show Redis connection pool usage"
+    )
+    @app_commands.guilds(Meta.SERVER.value)
+    @commands.has_any_role(Role.ADMIN.value)
+    async def redisstatus(self, ctx: commands.Context[commands.Bot]):
+        stats = redis_pool_stats()
+        avg_wait = stats.wait_seconds / stats.acquired if stats.acquired else 0
+
+        embed = discord.Embed(title="Redis status", color=discord.Color.blue())
+        embed.add_field(
+            name="Connections",
+            value=(
+                f"{stats.in_use}/{stats.max_size} in use ({stats.saturation:.0%}), "
+                f"{stats.idle} idle, {stats.waiting} waiting"
+            ),
+        )
+        embed.add_field(
+            name="Pool waits",
+            value=(
+                f"{stats.waits}/{stats.acquired} acquisitions, "
+                f"avg {avg_wait * 1000:.1f}ms, max {stats.max_wait_seconds * 1000:.0f}ms"
+            ),
+        )
+        await ctx.reply(embed=embed, ephemeral=True)
+
+    @redisstatus.error
+    async def redisstatus_error(
+        self, ctx: commands.Context[commands.Bot], error: commands.CommandError
+    ) -> None:
+        if isinstance(error, commands.MissingAnyRole):
+            await ctx.send(
+                "oops! you don't have permission to view redis status.",
+                ephemeral=True,
+            )
+
     @commands.command(name="echo", hidden=True)
     @commands.is_owner()
     async def echo(self, ctx: commands.Context[commands.Bot], *, message: str):
@@ -91,13 +128,6 @@ class General(commands.Cog):
             await ctx.reply(f"Error emulating user: {str(e)}", ephemeral=True)
 
     async def _eval_helper(self, ctx: commands.Context[commands.Bot], code: str):
-        from utils.redis import RedisManager
-
-        # create RedisManager just for connection, but use raw client for arbitrary keys
-        # the prefix doesn't matter, we won't use the wrapper methods
-        redis_manager = RedisManager(key_prefix="temp")
-        await redis_manager.connect()
-
         async def get_member(id: int) -> discord.Member | None:
             return await ctx.guild.fetch_member(id) if ctx.guild else None
 
@@ -131,7 +161,8 @@ class General(commands.Cog):
             "bot": self.bot,
             "ctx": ctx,
             "guild": ctx.guild,
-            "redis": redis_manager.redis,
+            # the shared client, unprefixed so that any key can be inspected
+            "redis": get_redis(),
             "discord": discord,
             "commands": commands,
             "random": random,
@@ -177,13 +208,6 @@ class General(commands.Cog):
             stdout_output = "\n".join(sys.stdout.output)
             sys.stdout = original_stdout
 
-            # clean up the redis connection
-            try:
-                await redis_manager.close()
-            except Exception as e:
-                print(f"Failed to close redis connection: {e}")
-                pass
-
         if stdout_output:
             embed.add_field(
                 name="stdout", value=f"```py\n{stdout_output}\n```", inline=False
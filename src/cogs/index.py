@@ -1,28 +1,151 @@
 import asyncio
+import datetime
 import time
+from typing import cast, override
 
 import discord
+import psycopg2
 from discord import app_commands
 from discord.ext import commands
 
 from utils.ids import Meta, Role
+from utils.index.database import (
+    activity_summary,
+    media_summary,
+    read_complete_checkpoints,
+    rebuild_interactions,
+    rebuild_rollups,
+    reply_chain,
+    search_messages,
+    top_pairs,
+    user_interactions,
+)
+from utils.index.fetcher import UnindexedMessageFetcher
+from utils.index.migrations import run_migrations
+from utils.index.partitions import ensure_partitions
+from utils.index.pool import pool
+from utils.index.reconcile import RECONCILE_WINDOW, reconcile_channels
+from utils.index.scheduler import (
+    BackfillScheduler,
+    StageTimings,
+    backfill_channel,
+    discover_channels,
+)
 from utils.index.utils import (
-    index_edited_message,
-    index_messages,
-    index_reaction,
+    CheckpointData,
+    DeleteData,
+    EditData,
+    ReactionEvent,
+    SearchQuery,
+    collect_message_data,
     render_progress_bar,
 )
+from utils.index.views import (
+    PAGE_SIZE,
+    SearchView,
+    render_reply_chain,
+    render_results,
+)
+from utils.index.writer import WRITE_ERRORS, IndexWriter, MessageBatch, WriteOp
 
 
 class Messages(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot: commands.Bot = bot
+        self.writer: IndexWriter = IndexWriter(pool)
+        self.fetcher: UnindexedMessageFetcher = UnindexedMessageFetcher(
+            bot, self.writer
+        )
+        self.writer.on_unindexed = self.fetcher.request
+        self._caught_up: bool = False
+
+        # checkpoints as of startup, before live messages start moving them
+        self._offline_checkpoints: list[CheckpointData] = []
+        self._prepared: asyncio.Event = asyncio.Event()
+        # set when migrations fail, the writer needs the current schema so the
+        # index stays off until the next successful start
+        self._unavailable: bool = False
+        self._partition_task: asyncio.Task[None] | None = None
+
+    @override
+    async def cog_load(self) -> None:
+        self.bot.loop.create_task(self._prepare_database())
+
+    async def _prepare_database(self) -> None:
+        # migrations can take a while on a large index, events queue up in the
+        # writer until they are done
+        try:
+            version = await asyncio.to_thread(run_migrations)
+            print(f"Index schema is at version {version}")
+        except psycopg2.Error as e:
+            print(f"Error while migrating the index, indexing is disabled: {e}")
+            self._unavailable = True
+            self.writer.discard()
+            self._prepared.set()
+            return
+
+        await self._ensure_partitions()
+
+        # live messages advance complete checkpoints, so catch up from where
+        # each channel was before the writer commits any of them
+        try:
+            self._offline_checkpoints = await pool.run(read_complete_checkpoints)
+        except psycopg2.Error as e:
+            print(f"Error while reading index checkpoints, skipping catch-up: {e}")
+
+        self.writer.start()
+        self.fetcher.start()
+        self._prepared.set()
+
+        self._partition_task = self.bot.loop.create_task(self._maintain_partitions())
+
+    async def _ensure_partitions(self) -> None:
+        try:
+            created = await asyncio.to_thread(ensure_partitions)
+            if created:
+                print(f"Created index partitions: {', '.join(created)}")
+        except psycopg2.Error as e:
+            print(f"Error while creating index partitions: {e}")
+
+    async def _maintain_partitions(self) -> None:
+        while not self.bot.is_closed():
+            # run every day, partitions are created months ahead
+            await asyncio.sleep(86400)
+            await self._ensure_partitions()
+
+    @override
+    async def cog_check(self, ctx: commands.Context[commands.Bot]) -> bool:
+        if self._unavailable:
+            await ctx.send(
+                "oops! the message index is unavailable, its migrations failed.",
+                ephemeral=True,
+            )
+            return False
+
+        return True
+
+    async def _submit(self, op: WriteOp) -> None:
+        # events are dropped rather than queued for a writer that won't start
+        if not self._unavailable:
+            await self.writer.submit(op)
+
+    @override
+    async def cog_unload(self) -> None:
+        if self._partition_task is not None:
+            self._partition_task.cancel()
+            self._partition_task = None
+
+        # flush pending writes before the bot shuts down
+        self.fetcher.stop()
+        await self.writer.close()
+        pool.close()
 
     @commands.hybrid_command(name="index", description="Index a channel's messages")
     @app_commands.describe(
-        channel="Channel to index",
+        channel="Channel to index, resuming from where the last run stopped",
         count="Approximate number of messages for progress bar",
         limit="Optional limit for the number of messages to index (default: all)",
+        reaction_users="Fetch who reacted, instead of only reaction counts (default: yes)",
     )
     @app_commands.guilds(Meta.SERVER.value)
     @commands.has_any_role(Role.ADMIN.value)
@@ -32,23 +155,22 @@ class Messages(commands.Cog):
         channel: discord.TextChannel,
         count: int,
         limit: int | None = None,
+        reaction_users: bool = True,
     ):
         await ctx.send(f"started indexing {channel.mention}", ephemeral=True)
-        asyncio.create_task(self._run_index(channel, count, limit))
+        asyncio.create_task(self._run_index(channel, count, limit, reaction_users))
 
     async def _run_index(
         self,
         channel: discord.TextChannel,
         count: int,
         limit: int | None,
+        reaction_users: bool,
     ):
         start_time = time.time()
-        processed = 0
+        timings = StageTimings()
         count = min(count, limit) if limit is not None else count
 
-        BATCH_SIZE = 100
-        buffer: list[discord.Message] = []
-
         progress_embed = discord.Embed(
             title=f"Indexing {channel.name}",
             description="Starting...",
@@ -57,36 +179,86 @@ class Messages(commands.Cog):
         progress_embed.set_footer(text="Elapsed: 0s")
         progress_message = await channel.send(embed=progress_embed)
 
-        async def process_batch():
-            await index_messages(buffer)
-            buffer.clear()
-
+        async def on_batch(processed: int):
             progress_bar = render_progress_bar(processed, count)
-            progress_embed.description = f"{progress_bar}\n{processed}/{count} messages"
+            progress_embed.description = (
+                f"{progress_bar}\n{processed}/{count} messages\n{timings}"
+            )
             progress_embed.set_footer(text=f"Elapsed: {int(time.time() - start_time)}s")
 
             await progress_message.edit(embed=progress_embed)
 
-        # process messages in batches
-        async for message in channel.history(limit=limit, oldest_first=True):
-            buffer.append(message)
-            processed += 1
-
-            if len(buffer) >= BATCH_SIZE:
-                await process_batch()
-
-        # process remaining messages
-        if buffer:
-            await process_batch()
+        try:
+            processed = await backfill_channel(
+                channel,
+                self.writer,
+                limit=limit,
+                on_batch=on_batch,
+                reaction_users=reaction_users,
+                timings=timings,
+            )
+        except (discord.HTTPException, *WRITE_ERRORS) as e:
+            print(f"Error while indexing {channel.name}: {e}")
+            progress_embed.description = f"Failed: {e}\n{timings}"
+            progress_embed.color = discord.Color.red()
+            progress_embed.set_footer(
+                text=f"Stopped after {int(time.time() - start_time)} seconds"
+            )
+            await progress_message.edit(embed=progress_embed)
+            return
 
-        progress_embed.description = f"Done! Indexed {processed} messages."
+        progress_embed.description = f"Done! Indexed {processed} messages.\n{timings}"
         progress_embed.color = discord.Color.green()
         progress_embed.set_footer(
             text=f"Total time: {int(time.time() - start_time)} seconds"
         )
         await progress_message.edit(embed=progress_embed)
 
+    @commands.hybrid_command(
+        name="indexall", description="Index every channel and thread in the server"
+    )
+    @app_commands.describe(
+        concurrency="Number of channels to index at the same time (default: 4)",
+        reaction_users="Fetch who reacted, instead of only reaction counts (default: yes)",
+    )
+    @app_commands.guilds(Meta.SERVER.value)
+    @commands.guild_only()
+    @commands.has_any_role(Role.ADMIN.value)
+    async def indexall(
+        self,
+        ctx: commands.Context[commands.Bot],
+        concurrency: app_commands.Range[int, 1, 16] = 4,
+        reaction_users: bool = True,
+    ):
+        guild = cast(discord.Guild, ctx.guild)
+        await ctx.defer(ephemeral=True)
+
+        channels = await discover_channels(guild)
+        await ctx.send(
+            f"started indexing {len(channels)} channels and threads", ephemeral=True
+        )
+
+        scheduler = BackfillScheduler(
+            self.writer,
+            channels,
+            concurrency=concurrency,
+            reaction_users=reaction_users,
+        )
+        asyncio.create_task(self._run_index_all(ctx.channel, scheduler))
+
+    async def _run_index_all(
+        self, destination: discord.abc.Messageable, scheduler: BackfillScheduler
+    ):
+        progress_message = await destination.send(embed=scheduler.to_embed())
+        task = asyncio.create_task(scheduler.run())
+
+        # refresh the dashboard periodically instead of on every batch
+        while not task.done():
+            await asyncio.wait([task], timeout=5)
+            await progress_message.edit(embed=scheduler.to_embed())
+
     @index.error
+    @indexall.error
     async def autoresponse_error(
         self, ctx: commands.Context[commands.Bot], error: commands.CommandError
     ) -> None:
@@ -96,31 +268,455 @@ class Messages(commands.Cog):
                 ephemeral=True,
             )
 
+    @commands.hybrid_command(
+        name="indexstatus",
+        description="Show the index writer's queue and connection pool metrics",
+    )
+    @app_commands.guilds(Meta.SERVER.value)
+    @commands.has_any_role(Role.ADMIN.value)
+    async def indexstatus(self, ctx: commands.Context[commands.Bot]):
+        stats = self.writer.stats
+        avg_batch = stats.written / stats.batches if stats.batches else 0
+
+        embed = discord.Embed(title="Index writer", color=discord.Color.blue())
+        embed.add_field(name="Queued", value=f"{stats.queued}/{stats.max_queue}")
+        embed.add_field(name="Written", value=str(stats.written))
+        embed.add_field(name="Failed", value=str(stats.failed))
+        embed.add_field(
+            name="Batches",
+            value=f"{stats.batches} (avg {avg_batch:.1f} ops, {stats.coalesced} coalesced)",
+        )
+        embed.add_field(
+            name="Last batch",
+            value=f"{stats.last_batch_size} ops in {stats.last_batch_seconds * 1000:.0f}ms",
+        )
+        embed.add_field(
+            name="Backpressure",
+            value=f"{stats.backpressure_waits} waits, {stats.backpressure_seconds:.1f}s",
+        )
+
+        embed.add_field(
+            name="Unindexed messages",
+            value=(
+                f"{self.fetcher.queued} queued, {self.fetcher.fetched} fetched, "
+                f"{self.fetcher.failed} failed"
+            ),
+        )
+
+        pool_stats = pool.stats
+        avg_wait = pool_stats.wait_seconds / pool_stats.waits if pool_stats.waits else 0
+        embed.add_field(
+            name="Connections",
+            value=(
+                f"{pool_stats.in_use}/{pool_stats.max_size} in use "
+                f"({pool_stats.saturation:.0%}), {pool_stats.waiting} waiting"
+            ),
+        )
+        embed.add_field(
+            name="Pool waits",
+            value=(
+                f"{pool_stats.waits}/{pool_stats.acquired} acquisitions, "
+                f"avg {avg_wait * 1000:.0f}ms, max {pool_stats.max_wait_seconds * 1000:.0f}ms"
+            ),
+        )
+        await ctx.send(embed=embed, ephemeral=True)
+
+    @indexstatus.error
+    async def indexstatus_error(
+        self, ctx: commands.Context[commands.Bot], error: commands.CommandError
+    ) -> None:
+        if isinstance(error, commands.MissingAnyRole):
+            await ctx.send(
+                "oops! you don't have permission to view index metrics.",
+                ephemeral=True,
+            )
+
+    @commands.hybrid_command(name="search", description="Search indexed messages")
+    @app_commands.describe(
+        query="Words or phrases to search for, use quotes for exact phrases",
+        author="Only messages from this user",
+        channel="Only messages in this channel, including its threads",
+        thread="Only messages in this thread",
+        after="Only messages on or after this date (YYYY-MM-DD)",
+        before="Only messages on or before this date (YYYY-MM-DD)",
+    )
+    @app_commands.guilds(Meta.SERVER.value)
+    @commands.has_any_role(Role.ADMIN.value, Role.MOD.value)
+    async def search_messages(
+        self,
+        ctx: commands.Context[commands.Bot],
+        query: str,
+        author: discord.User | None = None,
+        channel: discord.TextChannel | None = None,
+        thread: discord.Thread | None = None,
+        after: str | None = None,
+        before: str | None = None,
+    ):
+        try:
+            after_date = datetime.date.fromisoformat(after) if after else None
+            before_date = datetime.date.fromisoformat(before) if before else None
+        except ValueError:
+            await ctx.send(
+                "oops! dates must look like 2025-01-31.",
+                ephemeral=True,
+            )
+            return
+
+        def day_snowflake(date: datetime.date) -> int:
+            start = datetime.datetime.combine(date, datetime.time(), datetime.UTC)
+            return discord.utils.time_snowflake(start)
+
+        search_query = SearchQuery(
+            text=query,
+            author_id=author.id if author else None,
+            channel_id=channel.id if channel else None,
+            thread_id=thread.id if thread else None,
+            after_id=day_snowflake(after_date) if after_date else None,
+            before_id=day_snowflake(before_date + datetime.timedelta(days=1))
+            if before_date
+            else None,
+        )
+
+        await ctx.defer(ephemeral=True)
+        results = await pool.run(search_messages, search_query, limit=PAGE_SIZE)
+
+        view = SearchView(ctx.author.id, search_query, results)
+        await ctx.send(
+            embed=render_results(search_query, results, page=0),
+            view=view,
+            ephemeral=True,
+        )
+
+    @search_messages.error
+    async def search_error(
+        self, ctx: commands.Context[commands.Bot], error: commands.CommandError
+    ) -> None:
+        if isinstance(error, commands.MissingAnyRole):
+            await ctx.send(
+                "oops! you don't have permission to search messages.",
+                ephemeral=True,
+            )
+
+    @commands.hybrid_command(
+        name="activity", description="Show message and reaction activity"
+    )
+    @app_commands.describe(
+        user="Only show activity for this user",
+        days="Number of days to look back (default: 7)",
+    )
+    @app_commands.guilds(Meta.SERVER.value)
+    async def activity(
+        self,
+        ctx: commands.Context[commands.Bot],
+        user: discord.User | None = None,
+        days: app_commands.Range[int, 1, 365] = 7,
+    ):
+        since = discord.utils.utcnow() - datetime.timedelta(days=days)
+        summary = await pool.run(
+            activity_summary, since, user_id=user.id if user else None
+        )
+
+        title = f"Activity for {user.display_name}" if user else "Server activity"
+        embed = discord.Embed(
+            title=f"{title} (last {days} day{'s' if days != 1 else ''})",
+            description=f"{summary.messages} messages • {summary.reactions} reactions",
+            color=discord.Color.blue(),
+        )
+
+        if not user and summary.users:
+            embed.add_field(
+                name="Top users",
+                value="\n".join(
+                    f"<@{user_id}>: {messages}"
+                    for user_id, messages, _ in summary.users
+                ),
+            )
+
+        if summary.channels:
+            embed.add_field(
+                name="Top channels",
+                value="\n".join(
+                    f"<#{channel_id}>: {messages}"
+                    for channel_id, messages, _ in summary.channels
+                ),
+            )
+
+        if summary.hours:
+            embed.add_field(
+                name="Busiest hours (UTC)",
+                value="\n".join(
+                    f"{hour:02d}:00: {messages}" for hour, messages, _ in summary.hours
+                ),
+            )
+
+        await ctx.reply(embed=embed, ephemeral=True)
+
+    @commands.hybrid_command(
+        name="media", description="Show attachment and embed stats"
+    )
+    @app_commands.describe(days="Number of days to look back (default: 30)")
+    @app_commands.guilds(Meta.SERVER.value)
+    async def media(
+        self,
+        ctx: commands.Context[commands.Bot],
+        days: app_commands.Range[int, 1, 365] = 30,
+    ):
+        since = discord.utils.utcnow() - datetime.timedelta(days=days)
+        summary = await pool.run(media_summary, discord.utils.time_snowflake(since))
+
+        embed = discord.Embed(
+            title=f"Media (last {days} day{'s' if days != 1 else ''})",
+            description=(
+                f"{summary.attachments} attachments • {summary.bytes / 1024**2:.1f} MiB"
+            ),
+            color=discord.Color.blue(),
+        )
+
+        if summary.content_types:
+            embed.add_field(
+                name="Attachment types",
+                value="\n".join(
+                    f"{content_type}: {count} ({size / 1024**2:.1f} MiB)"
+                    for content_type, count, size in summary.content_types
+                ),
+            )
+
+        if summary.stickers:
+            embed.add_field(
+                name="Top stickers",
+                value="\n".join(f"{name}: {count}" for name, count in summary.stickers),
+            )
+
+        if summary.providers:
+            embed.add_field(
+                name="Top link previews",
+                value="\n".join(
+                    f"{provider}: {count}" for provider, count in summary.providers
+                ),
+            )
+
+        await ctx.reply(embed=embed, ephemeral=True)
+
+    @commands.hybrid_command(
+        name="rebuildactivity",
+        description="Recompute activity stats from the whole index",
+    )
+    @app_commands.guilds(Meta.SERVER.value)
+    @commands.has_any_role(Role.ADMIN.value)
+    async def rebuildactivity(self, ctx: commands.Context[commands.Bot]):
+        await ctx.defer(ephemeral=True)
+
+        start_time = time.time()
+        await pool.run(rebuild_rollups)
+        await pool.run(rebuild_interactions)
+
+        await ctx.send(
+            f"rebuilt activity stats in {time.time() - start_time:.1f}s",
+            ephemeral=True,
+        )
+
+    @rebuildactivity.error
+    async def rebuildactivity_error(
+        self, ctx: commands.Context[commands.Bot], error: commands.CommandError
+    ) -> None:
+        if isinstance(error, commands.MissingAnyRole):
+            await ctx.send(
+                "oops! you don't have permission to rebuild activity stats.",
+                ephemeral=True,
+            )
+
+    @commands.hybrid_command(
+        name="interactions", description="Show who replies to and mentions whom"
+    )
+    @app_commands.describe(
+        user="Only show who this user interacts with",
+        days="Number of days to look back (default: 30)",
+    )
+    @app_commands.guilds(Meta.SERVER.value)
+    async def interactions(
+        self,
+        ctx: commands.Context[commands.Bot],
+        user: discord.User | None = None,
+        days: app_commands.Range[int, 1, 365] = 30,
+    ):
+        since = discord.utils.utcnow() - datetime.timedelta(days=days)
+        period = f"last {days} day{'s' if days != 1 else ''}"
+
+        if user:
+            rows = await pool.run(user_interactions, user.id, since)
+            embed = discord.Embed(
+                title=f"Who {user.display_name} talks to ({period})",
+                description="\n".join(
+                    f"<@{other_id}>: {outgoing} sent • {incoming} received"
+                    for other_id, outgoing, incoming in rows
+                )
+                or "no replies or mentions found",
+                color=discord.Color.blue(),
+            )
+        else:
+            pairs = await pool.run(top_pairs, since)
+            embed = discord.Embed(
+                title=f"Who talks to whom ({period})",
+                description="\n".join(
+                    f"<@{user_id}> ↔ <@{other_id}>: "
+                    f"{replies} replies • {mentions} mentions"
+                    for user_id, other_id, replies, mentions in pairs
+                )
+                or "no replies or mentions found",
+                color=discord.Color.blue(),
+            )
+
+        await ctx.reply(embed=embed, ephemeral=True)
+
+    @commands.hybrid_command(
+        name="replychain",
+        description="Show the replies leading up to and following a message",
+    )
+    @app_commands.describe(message="Message id or link")
+    @app_commands.guilds(Meta.SERVER.value)
+    @commands.has_any_role(Role.ADMIN.value, Role.MOD.value)
+    async def replychain(self, ctx: commands.Context[commands.Bot], message: str):
+        try:
+            # links end with the message id
+            message_id = int(message.rstrip("/").rsplit("/", 1)[-1])
+        except ValueError:
+            await ctx.send("oops! that isn't a message id or link.", ephemeral=True)
+            return
+
+        await ctx.defer(ephemeral=True)
+        chain = await pool.run(reply_chain, message_id)
+        await ctx.send(embed=render_reply_chain(chain), ephemeral=True)
+
+    @replychain.error
+    async def replychain_error(
+        self, ctx: commands.Context[commands.Bot], error: commands.CommandError
+    ) -> None:
+        if isinstance(error, commands.MissingAnyRole):
+            await ctx.send(
+                "oops! you don't have permission to view reply chains.",
+                ephemeral=True,
+            )
+
+    @commands.hybrid_command(
+        name="reconcile",
+        description="Resync reactions on recent messages with discord",
+    )
+    @app_commands.describe(
+        hours="How many hours back to check, up to a week (default: 48)"
+    )
+    @app_commands.guilds(Meta.SERVER.value)
+    @commands.has_any_role(Role.ADMIN.value)
+    async def reconcile(
+        self,
+        ctx: commands.Context[commands.Bot],
+        hours: app_commands.Range[int, 1, 168] = 48,
+    ):
+        await ctx.defer(ephemeral=True)
+
+        start_time = time.time()
+        stats = await reconcile_channels(
+            await self._indexed_channels(),
+            self.writer,
+            discord.utils.utcnow() - datetime.timedelta(hours=hours),
+        )
+
+        await ctx.send(
+            f"reconciled the last {hours}h in {time.time() - start_time:.1f}s: {stats}",
+            ephemeral=True,
+        )
+
+    @reconcile.error
+    async def reconcile_error(
+        self, ctx: commands.Context[commands.Bot], error: commands.CommandError
+    ) -> None:
+        if isinstance(error, commands.MissingAnyRole):
+            await ctx.send(
+                "oops! you don't have permission to reconcile the index.",
+                ephemeral=True,
+            )
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # on_ready also fires after reconnects, only catch up once per process
+        if self._caught_up:
+            return
+
+        self._caught_up = True
+        asyncio.create_task(self._catch_up())
+
+    async def _indexed_channels(
+        self, checkpoints: list[CheckpointData] | None = None
+    ) -> list[discord.TextChannel | discord.Thread]:
+        """Cached channels whose history is fully indexed."""
+        if checkpoints is None:
+            checkpoints = await pool.run(read_complete_checkpoints)
+
+        channels: list[discord.TextChannel | discord.Thread] = []
+        for checkpoint in checkpoints:
+            # archived threads aren't cached, but they can't have new messages
+            # either, since posting in a thread unarchives it
+            channel = self.bot.get_channel(checkpoint.channel_id)
+            if isinstance(channel, (discord.TextChannel, discord.Thread)):
+                channels.append(channel)
+
+        return channels
+
+    async def _catch_up(self):
+        """Index what changed while the bot was offline in fully indexed channels."""
+        await self._prepared.wait()
+        if self._unavailable:
+            return
+
+        checkpoints = self._offline_checkpoints
+        channels = await self._indexed_channels(checkpoints)
+
+        scheduler = BackfillScheduler(
+            self.writer,
+            channels,
+            checkpoints={c.channel_id: c for c in checkpoints},
+        )
+        await scheduler.run()
+
+        print(
+            f"Caught up {len(channels)} channels, "
+            f"indexed {scheduler.processed} missed messages"
+        )
+
+        # reaction events missed while offline don't show up as new messages,
+        # compare recent messages against discord instead
+        stats = await reconcile_channels(
+            channels, self.writer, discord.utils.utcnow() - RECONCILE_WINDOW
+        )
+        print(f"Reconciled reactions: {stats}")
+
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
-        await index_messages([message])
+        message_data = await collect_message_data([message])
+        await self._submit(MessageBatch(message_data))
+
+    # raw events fire whether or not the message is in the message cache, and
+    # carry everything the index needs without fetching the message
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        await self._submit(EditData.from_message(payload.message))
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        await self._submit(DeleteData.from_payload(payload))
 
     @commands.Cog.listener()
-    async def on_message_edit(self, _: discord.Message, after: discord.Message):
-        await index_edited_message(after)
+    async def on_raw_bulk_message_delete(
+        self, payload: discord.RawBulkMessageDeleteEvent
+    ):
+        await self._submit(DeleteData.from_bulk_payload(payload))
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
-        await index_reaction(
-            message_id=payload.message_id,
-            user_id=payload.user_id,
-            emoji=payload.emoji,
-            action="add",
-        )
+        await self._submit(ReactionEvent.from_payload(payload, "add"))
 
     @commands.Cog.listener()
     async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
-        await index_reaction(
-            message_id=payload.message_id,
-            user_id=payload.user_id,
-            emoji=payload.emoji,
-            action="remove",
-        )
+        await self._submit(ReactionEvent.from_payload(payload, "remove"))
 
 
 async def setup(bot: commands.Bot) -> None:
@@ -8,13 +8,23 @@ from discord.member import Member
 from utils.ids import PEAS, Meta, Role
 from utils.snowpea.database import SnowpeaDatabase
 
+LEADERBOARD_SIZE = 10
+LEADERBOARD_PAGE_SIZE = 25
+
 
 class Snowpea(commands.Cog):
     def __init__(self, bot: commands.Bot) -> None:
         self.bot: commands.Bot = bot
         self.database: SnowpeaDatabase = SnowpeaDatabase()
 
-        self.bot.loop.create_task(self.database.connect())
+        self.bot.loop.create_task(self._init_database())
+
+    async def _init_database(self) -> None:
+        await self.database.connect()
+
+        migrated = await self.database.migrate_counts()
+        if migrated:
+            print(f"Migrated {migrated} snowpea counts to leaderboards")
 
     @commands.hybrid_group(name="snowpea", description="Snowpea related commands")
     @app_commands.guilds(Meta.SERVER.value)
@@ -83,13 +93,6 @@ class Snowpea(commands.Cog):
             )
             return
 
-        user_ids = await self.database.get_users_with_stats(resolved)
-
-        if not user_ids:
-            await ctx.reply("no statistics available yet", ephemeral=True)
-            return
-
-        stats: list[tuple[Member, int]] = []
         guild = ctx.guild
         if not guild or not guild.id == Meta.SERVER.value:
             await ctx.reply(
@@ -97,31 +100,24 @@ class Snowpea(commands.Cog):
             )
             return
 
-        # iterate through these user IDs and get their stats
-        for user_id_str in user_ids:
-            try:
-                user_id = int(user_id_str)
+        # walk the ranking a page at a time until there are enough members,
+        # skipping users who left the server
+        stats: list[tuple[Member, int]] = []
+        start = 0
+        while len(stats) < LEADERBOARD_SIZE:
+            page = await self.database.get_leaderboard(
+                resolved, start, start + LEADERBOARD_PAGE_SIZE - 1
+            )
+            for user_id, count in page:
                 member = guild.get_member(user_id)
-                if not member:
-                    # skip users not in the guild
-                    continue
-
-                if resolved == "received":
-                    count = await self.database.get_received_count(member.id)
-                else:  # initiated
-                    count = await self.database.get_initiated_count(member.id)
-
-                if count > 0:
-                    # only include users with non-zero counts
+                if member and count > 0:
                     stats.append((member, count))
-            except (ValueError, TypeError):
-                # skip invalid user IDs
-                continue
 
-        # sort by count in descending order
-        stats.sort(key=lambda x: x[1], reverse=True)
+            if len(page) < LEADERBOARD_PAGE_SIZE:
+                break
+            start += LEADERBOARD_PAGE_SIZE
 
-        top_users: list[tuple[Member, int]] = stats[:10]
+        top_users: list[tuple[Member, int]] = stats[:LEADERBOARD_SIZE]
         if not top_users:
             await ctx.reply("no statistics available yet", ephemeral=True)
             return
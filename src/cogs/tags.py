@@ -3,12 +3,14 @@ import datetime
 from typing import cast, override
 
 import discord
+import redis.asyncio as redis
 from discord import app_commands
 from discord.ext import commands
 
 from utils.ids import Meta, Role
 from utils.tags.database import TagDatabase
 from utils.tags.models import TagData
+from utils.tags.usage import TagUsageBuffer
 from utils.tags.utils import fuzzy_search
 
 
@@ -105,6 +107,7 @@ class Tags(commands.Cog):
     def __init__(self, bot: commands.Bot) -> None:
         self.bot: commands.Bot = bot
         self.db: TagDatabase = TagDatabase()
+        self.usage: TagUsageBuffer = TagUsageBuffer(self.db)
         self.tags: dict[str, TagData] = {}
         self._ready: asyncio.Event = asyncio.Event()
 
@@ -124,7 +127,13 @@ class Tags(commands.Cog):
     async def load_tags(self) -> None:
         try:
             await self.db.connect()
+
+            converted = await self.db.migrate_json_tags()
+            if converted:
+                print(f"Converted {converted} tags to hashes")
+
             self.tags = await self.db.get_all_tags()
+            self.usage.start()
             self._ready.set()
         except Exception as e:
             # propagate the error instead of falling back to empty tags
@@ -169,7 +178,7 @@ class Tags(commands.Cog):
                         if message.content != tag.content:
                             # content has changed, update the tag
                             tag.content = message.content
-                            await self.db.update_tag(tag)
+                            await self.db.set_content(tag_name, tag.content)
 
                             print(
                                 f"Updated content for tag '{tag_name}' from source message"
@@ -229,11 +238,9 @@ class Tags(commands.Cog):
     async def _display_tag(
         self, ctx: commands.Context[commands.Bot], tag: TagData
     ) -> None:
+        # written to redis in the background
         tag.uses += 1
-        try:
-            await self.db.update_tag(tag)
-        except Exception as e:
-            print(f"Error updating tag usage count: {e}")
+        self.usage.record(tag.name)
 
         author_name = tag.author_name
         try:
@@ -380,7 +387,7 @@ class Tags(commands.Cog):
                 tag.starred = not tag.starred
 
                 # update the tag in the database
-                success = await self.db.update_tag(tag)
+                success = await self.db.set_starred(name, tag.starred)
                 if success:
                     status = "starred" if tag.starred else "unstarred"
                     await ctx.reply(f"tag '{name}' has been {status}", ephemeral=True)
@@ -414,6 +421,7 @@ class Tags(commands.Cog):
                 if success:
                     # delete from memory if database deletion was successful
                     del self.tags[name]
+                    self.usage.discard(name)
                     await ctx.reply(f"tag '{name}' has been deleted", ephemeral=True)
                 else:
                     await ctx.reply(
@@ -440,6 +448,12 @@ class Tags(commands.Cog):
         self.bot.tree.remove_command(
             self.create_tag_context.name, type=self.create_tag_context.type
         )
+
+        try:
+            await self.usage.close()
+        except redis.RedisError as e:
+            print(f"Failed to flush tag usage counts: {e}")
+
         await self.db.close()
 
 
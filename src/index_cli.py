@@ -0,0 +1,89 @@
+"""Offline import and export of the message index.
+
+Run with e.g. `uv run src/index_cli.py import exports/*.json`, or
+`uv run --with pyarrow src/index_cli.py export snapshot/ --since 2025-01-01`.
+"""
+
+import argparse
+import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def import_exports(paths: list[Path], batch_size: int) -> None:
+    # imported here so that the environment is loaded before connecting
+    from utils.index.importer import ImportStats, import_export
+    from utils.index.migrations import run_migrations
+    from utils.index.partitions import ensure_partitions
+
+    print(f"Index schema is at version {run_migrations()}")
+    ensure_partitions()
+
+    total = ImportStats()
+    for path in paths:
+        stats = import_export(path, batch_size=batch_size)
+        print(f"{path.name}: {stats}")
+
+        total.read += stats.read
+        total.inserted += stats.inserted
+        total.seconds += stats.seconds
+
+    if len(paths) > 1:
+        print(f"Total: {total}")
+
+
+def export_index(
+    out: Path,
+    since: datetime.date | None,
+    file_format: str,
+    tables: list[str] | None,
+) -> None:
+    from utils.index.exporter import export_index
+
+    stats = export_index(
+        out,
+        since=since,
+        file_format="arrow" if file_format == "arrow" else "parquet",
+        tables=tables,
+    )
+    print(f"Exported {stats}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser(
+        "import", help="Import DiscordChatExporter JSON exports"
+    )
+    import_parser.add_argument("paths", nargs="+", type=Path)
+    import_parser.add_argument("--batch-size", type=int, default=1000)
+
+    export_parser = subparsers.add_parser(
+        "export", help="Export the index to Parquet or Arrow files, by month"
+    )
+    export_parser.add_argument("out", type=Path)
+    export_parser.add_argument(
+        "--since",
+        type=datetime.date.fromisoformat,
+        help="Only re-export months from this date (YYYY-MM-DD) onwards",
+    )
+    export_parser.add_argument(
+        "--format", choices=["parquet", "arrow"], default="parquet"
+    )
+    export_parser.add_argument(
+        "--tables", nargs="+", choices=["message", "mention", "reaction"]
+    )
+
+    args = parser.parse_args()
+    if args.command == "import":
+        import_exports(args.paths, args.batch_size)
+    elif args.command == "export":
+        export_index(args.out, args.since, args.format, args.tables)
+
+
+if __name__ == "__main__":
+    main()
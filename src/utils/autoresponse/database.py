@@ -5,15 +5,14 @@ from utils.autoresponse.models import AutoresponseData
 
 
 class AutoresponseDatabase(RedisManager):
-    def __init__(self) -> None:
-        super().__init__(key_prefix="autoresponse")
+    def __init__(self, key_prefix: str = "autoresponse") -> None:
+        super().__init__(key_prefix=key_prefix)
 
     async def get_all_autoresponses(self) -> dict[str, AutoresponseData]:
         autoresponses: dict[str, AutoresponseData] = {}
-        names = await self.smembers("")
+        names = sorted(await self.smembers(""))
 
-        for name in names:
-            data_json = await self.get(name)
+        for name, data_json in zip(names, await self.mget(names)):
             if data_json:
                 data_dict = json.loads(data_json)
                 autoresponses[name] = AutoresponseData.from_dict(data_dict)
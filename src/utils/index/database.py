@@ -0,0 +1,1100 @@
+# pyright: reportUnknownMemberType=false, reportMissingTypeStubs=false
+
+from collections import Counter
+from datetime import datetime
+
+from psycopg2.extensions import cursor as Cursor
+from psycopg2.extras import execute_values
+
+from utils.index.statements import (
+    MESSAGE_CHANNEL,
+    REACTION_ADD,
+    REACTION_COUNT_REMOVE,
+    REACTION_REMOVE,
+)
+from utils.index.utils import (
+    ActivitySummary,
+    CheckpointData,
+    DeleteData,
+    EditData,
+    EmbedData,
+    MediaSummary,
+    MessageData,
+    ReactionEvent,
+    ReactionSnapshot,
+    SearchQuery,
+    SearchResult,
+)
+
+# rows per multi-row INSERT statement
+PAGE_SIZE = 1000
+
+# (hour, channel_id, user_id)
+RollupKey = tuple[datetime, int, int]
+
+
+def hour_bucket(timestamp: datetime) -> datetime:
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def bump_rollups(
+    cursor: Cursor,
+    messages: Counter[RollupKey] | None = None,
+    reactions: Counter[RollupKey] | None = None,
+) -> None:
+    """Add message and reaction count deltas to the hourly activity rollups."""
+    messages = messages or Counter()
+    reactions = reactions or Counter()
+
+    keys = sorted(messages.keys() | reactions.keys())
+    if not keys:
+        return
+
+    execute_values(
+        cursor,
+        """
+        INSERT INTO activity_rollup (bucket, channel_id, user_id, messages, reactions)
+        VALUES %s
+        ON CONFLICT (bucket, channel_id, user_id) DO UPDATE SET
+            messages = activity_rollup.messages + EXCLUDED.messages,
+            reactions = activity_rollup.reactions + EXCLUDED.reactions
+        """,
+        [(*key, messages[key], reactions[key]) for key in keys],
+        page_size=PAGE_SIZE,
+    )
+
+
+# (day, source_user_id, target_user_id)
+EdgeKey = tuple[datetime, int, int]
+
+
+def day_bucket(timestamp: datetime) -> datetime:
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def bump_edges(
+    cursor: Cursor,
+    replies: Counter[EdgeKey] | None = None,
+    mentions: Counter[EdgeKey] | None = None,
+) -> None:
+    """Add reply and mention count deltas to the daily interaction edges."""
+    replies = replies or Counter()
+    mentions = mentions or Counter()
+
+    keys = sorted(replies.keys() | mentions.keys())
+    if not keys:
+        return
+
+    execute_values(
+        cursor,
+        """
+        INSERT INTO interaction_edge (
+            bucket, source_user_id, target_user_id, replies, mentions
+        )
+        VALUES %s
+        ON CONFLICT (bucket, source_user_id, target_user_id) DO UPDATE SET
+            replies = interaction_edge.replies + EXCLUDED.replies,
+            mentions = interaction_edge.mentions + EXCLUDED.mentions
+        """,
+        [(*key, replies[key], mentions[key]) for key in keys],
+        page_size=PAGE_SIZE,
+    )
+
+
+def insert_messages(cursor: Cursor, message_data: list[MessageData]) -> set[int]:
+    """Bulk insert messages along with their mentions and reactions.
+
+    Runs inside the caller's transaction. Messages that are already indexed are
+    skipped via `ON CONFLICT DO NOTHING`, which works on the partitioned table's
+    (message_id, timestamp) key because the timestamp follows from the id. Only
+    the mentions and reactions of newly inserted messages are written. Returns
+    the ids of the inserted messages.
+    """
+    if not message_data:
+        return set()
+
+    # dedupe within the batch, the first occurrence wins
+    unique: dict[int, MessageData] = {}
+    for data in message_data:
+        unique.setdefault(data.message_id, data)
+
+    inserted_rows = execute_values(
+        cursor,
+        """
+        INSERT INTO message (
+            message_id, author_id, is_bot, channel_id, thread_id,
+            content, "timestamp", reply_to
+        )
+        VALUES %s
+        ON CONFLICT (message_id, "timestamp") DO NOTHING
+        RETURNING message_id
+        """,
+        [
+            (
+                data.message_id,
+                data.author_id,
+                data.is_bot,
+                data.channel_id,
+                data.thread_id,
+                data.content,
+                data.timestamp,
+                data.reply_to,
+            )
+            for data in unique.values()
+        ],
+        page_size=PAGE_SIZE,
+        fetch=True,
+    )
+    inserted = {row[0] for row in inserted_rows}
+
+    mention_rows: list[tuple[int, int]] = []
+    mention_edges: Counter[EdgeKey] = Counter()
+    reaction_rows: set[tuple[int, int, int | None, str | None, datetime]] = set()
+    count_rows: list[tuple[int, int | None, str | None, int]] = []
+    message_rollups: Counter[RollupKey] = Counter()
+
+    for message_id in inserted:
+        data = unique[message_id]
+        for uid in set(data.mentioned_ids):
+            mention_rows.append((message_id, uid))
+            if uid != data.author_id:
+                mention_edges[(day_bucket(data.timestamp), data.author_id, uid)] += 1
+
+        message_rollups[
+            (hour_bucket(data.timestamp), data.channel_id, data.author_id)
+        ] += 1
+
+        for reaction_data in data.reactions:
+            if reaction_data.users is None:
+                # users weren't fetched, keep the aggregate count instead
+                count_rows.append(
+                    (
+                        message_id,
+                        reaction_data.emoji_id,
+                        reaction_data.emoji_unicode,
+                        reaction_data.count,
+                    )
+                )
+                continue
+
+            for user_id in reaction_data.users:
+                reaction_rows.add(
+                    (
+                        message_id,
+                        user_id,
+                        reaction_data.emoji_id,
+                        reaction_data.emoji_unicode,
+                        # use the message timestamp for old reactions
+                        data.timestamp,
+                    )
+                )
+
+    if mention_rows:
+        execute_values(
+            cursor,
+            "INSERT INTO mention (message, mentioned_user_id) VALUES %s",
+            mention_rows,
+            page_size=PAGE_SIZE,
+        )
+
+    inserted_reactions: list[tuple[int, int, datetime]] = []
+    if reaction_rows:
+        inserted_reactions = execute_values(
+            cursor,
+            """
+            INSERT INTO reaction (
+                message, user_id, emoji_id, emoji_unicode, "timestamp"
+            )
+            VALUES %s
+            ON CONFLICT DO NOTHING
+            RETURNING message, user_id, "timestamp"
+            """,
+            list(reaction_rows),
+            page_size=PAGE_SIZE,
+            fetch=True,
+        )
+
+    # count only the reactions that were actually inserted
+    reaction_rollups: Counter[RollupKey] = Counter()
+    for message_id, user_id, timestamp in inserted_reactions:
+        channel_id = unique[message_id].channel_id
+        reaction_rollups[(hour_bucket(timestamp), channel_id, user_id)] += 1
+
+    bump_rollups(cursor, message_rollups, reaction_rollups)
+
+    # replies to messages that aren't indexed yet have no known target, those
+    # edges are only picked up by a rebuild
+    replies = [
+        (data, data.reply_to)
+        for data in (unique[message_id] for message_id in inserted)
+        if data.reply_to
+    ]
+    reply_edges: Counter[EdgeKey] = Counter()
+    if replies:
+        cursor.execute(
+            "SELECT message_id, author_id FROM message WHERE message_id = ANY(%s)",
+            (sorted({reply_to for _, reply_to in replies}),),
+        )
+        authors: dict[int, int] = dict(cursor.fetchall())
+        for data, reply_to in replies:
+            target = authors.get(reply_to)
+            if target is not None and target != data.author_id:
+                reply_edges[(day_bucket(data.timestamp), data.author_id, target)] += 1
+
+    bump_edges(cursor, reply_edges, mention_edges)
+
+    if count_rows:
+        execute_values(
+            cursor,
+            """
+            INSERT INTO reaction_count (message, emoji_id, emoji_unicode, count)
+            VALUES %s
+            """,
+            count_rows,
+            page_size=PAGE_SIZE,
+        )
+
+    insert_media(cursor, [unique[message_id] for message_id in inserted])
+
+    return inserted
+
+
+def _insert_embeds(
+    cursor: Cursor,
+    rows: list[tuple[int, str | None, str | None, str | None, str | None]],
+) -> None:
+    if rows:
+        execute_values(
+            cursor,
+            "INSERT INTO embed (message, type, url, title, provider) VALUES %s",
+            rows,
+            page_size=PAGE_SIZE,
+        )
+
+
+def insert_media(cursor: Cursor, message_data: list[MessageData]) -> None:
+    """Insert the attachments, embeds and stickers of newly inserted messages."""
+    attachment_rows = [
+        (
+            attachment.attachment_id,
+            data.message_id,
+            attachment.filename,
+            attachment.content_type,
+            attachment.size,
+            attachment.width,
+            attachment.height,
+            attachment.url,
+        )
+        for data in message_data
+        for attachment in data.attachments
+    ]
+    embed_rows = [
+        (data.message_id, embed.type, embed.url, embed.title, embed.provider)
+        for data in message_data
+        for embed in data.embeds
+    ]
+    sticker_rows = [
+        (data.message_id, sticker.sticker_id, sticker.name, sticker.format)
+        for data in message_data
+        for sticker in data.stickers
+    ]
+
+    if attachment_rows:
+        execute_values(
+            cursor,
+            """
+            INSERT INTO attachment (
+                attachment_id, message, filename, content_type, size,
+                width, height, url
+            )
+            VALUES %s
+            ON CONFLICT (attachment_id) DO NOTHING
+            """,
+            attachment_rows,
+            page_size=PAGE_SIZE,
+        )
+
+    _insert_embeds(cursor, embed_rows)
+
+    if sticker_rows:
+        execute_values(
+            cursor,
+            """
+            INSERT INTO message_sticker (message, sticker_id, name, format)
+            VALUES %s
+            """,
+            sticker_rows,
+            page_size=PAGE_SIZE,
+        )
+
+
+def sync_embeds(cursor: Cursor, embeds: dict[int, list[EmbedData]]) -> None:
+    """Replace the embeds of indexed messages where they changed."""
+    if not embeds:
+        return
+
+    cursor.execute(
+        """
+        SELECT message, type, url, title, provider FROM embed
+        WHERE message = ANY(%s)
+        ORDER BY id
+        """,
+        (sorted(embeds),),
+    )
+    indexed: dict[int, list[EmbedData]] = {message_id: [] for message_id in embeds}
+    for row in cursor.fetchall():
+        indexed[row[0]].append(EmbedData(*row[1:]))
+
+    changed = [
+        message_id
+        for message_id, wanted in embeds.items()
+        if wanted != indexed[message_id]
+    ]
+    if not changed:
+        return
+
+    cursor.execute("DELETE FROM embed WHERE message = ANY(%s)", (changed,))
+    _insert_embeds(
+        cursor,
+        [
+            (message_id, embed.type, embed.url, embed.title, embed.provider)
+            for message_id in changed
+            for embed in embeds[message_id]
+        ],
+    )
+
+
+def upsert_checkpoints(cursor: Cursor, checkpoints: list[CheckpointData]) -> None:
+    """Record backfill progress, never moving a checkpoint backwards."""
+    if not checkpoints:
+        return
+
+    # keep the furthest checkpoint per channel
+    latest: dict[int, CheckpointData] = {}
+    for checkpoint in checkpoints:
+        current = latest.get(checkpoint.channel_id)
+        if not current or current.last_message_id <= checkpoint.last_message_id:
+            latest[checkpoint.channel_id] = checkpoint
+
+    execute_values(
+        cursor,
+        """
+        INSERT INTO index_checkpoint (
+            channel_id, last_message_id, last_timestamp, complete
+        )
+        VALUES %s
+        ON CONFLICT (channel_id) DO UPDATE SET
+            last_message_id = EXCLUDED.last_message_id,
+            last_timestamp = EXCLUDED.last_timestamp,
+            complete = index_checkpoint.complete OR EXCLUDED.complete
+        WHERE index_checkpoint.last_message_id <= EXCLUDED.last_message_id
+        """,
+        [
+            (c.channel_id, c.last_message_id, c.last_timestamp, c.complete)
+            for c in latest.values()
+        ],
+        page_size=PAGE_SIZE,
+    )
+
+
+def advance_checkpoints(cursor: Cursor, message_data: list[MessageData]) -> None:
+    """Move the checkpoints of fully backfilled channels past live messages."""
+    newest: dict[int, MessageData] = {}
+    for data in message_data:
+        key = data.thread_id or data.channel_id
+        current = newest.get(key)
+        if not current or current.message_id < data.message_id:
+            newest[key] = data
+
+    if not newest:
+        return
+
+    execute_values(
+        cursor,
+        """
+        UPDATE index_checkpoint AS c
+        SET last_message_id = v.message_id, last_timestamp = v.ts
+        FROM (VALUES %s) AS v (channel_id, message_id, ts)
+        WHERE c.channel_id = v.channel_id
+            AND c.complete
+            AND c.last_message_id < v.message_id
+        """,
+        [(key, data.message_id, data.timestamp) for key, data in newest.items()],
+        page_size=PAGE_SIZE,
+    )
+
+
+def read_checkpoint(cursor: Cursor, channel_id: int) -> CheckpointData | None:
+    cursor.execute(
+        """
+        SELECT channel_id, last_message_id, last_timestamp, complete
+        FROM index_checkpoint
+        WHERE channel_id = %s
+        """,
+        (channel_id,),
+    )
+    row = cursor.fetchone()
+    return CheckpointData(*row) if row else None
+
+
+def read_complete_checkpoints(cursor: Cursor) -> list[CheckpointData]:
+    cursor.execute(
+        """
+        SELECT channel_id, last_message_id, last_timestamp, complete
+        FROM index_checkpoint
+        WHERE complete
+        """
+    )
+    return [CheckpointData(*row) for row in cursor.fetchall()]
+
+
+def apply_reaction(cursor: Cursor, event: ReactionEvent) -> bool:
+    """Add or remove a single reaction and keep the rollups in step.
+
+    Reactions indexed only as an aggregate count have no row to delete, so a
+    remove that matches no row takes one off the count instead. Returns False
+    without writing anything if the message isn't indexed.
+    """
+    MESSAGE_CHANNEL.execute(cursor, event.message_id)
+    row = cursor.fetchone()
+    if row is None:
+        return False
+
+    channel_id: int = row[0]
+    params = (event.message_id, event.user_id, event.emoji_id, event.emoji_unicode)
+
+    if event.action == "add":
+        REACTION_ADD.execute(cursor, *params, event.timestamp)
+        delta = 1
+    else:
+        REACTION_REMOVE.execute(cursor, *params)
+        delta = -1
+
+    rows = cursor.fetchall()
+    if event.action == "remove" and not rows:
+        REACTION_COUNT_REMOVE.execute(
+            cursor, event.message_id, event.emoji_id, event.emoji_unicode
+        )
+
+    rollups: Counter[RollupKey] = Counter()
+    for (timestamp,) in rows:
+        rollups[(hour_bucket(timestamp), channel_id, event.user_id)] += delta
+
+    bump_rollups(cursor, reactions=rollups)
+    return True
+
+
+# (message_id, user_id, emoji_id, emoji_unicode)
+ReactionKey = tuple[int, int, int | None, str | None]
+
+
+def read_reaction_counts(
+    cursor: Cursor, message_ids: list[int]
+) -> dict[int, Counter[tuple[int | None, str | None]]]:
+    """Indexed count of each emoji on the given messages.
+
+    Messages that aren't indexed are left out, and indexed messages without
+    reactions map to an empty counter.
+    """
+    cursor.execute(
+        """
+        SELECT m.message_id, r.emoji_id, r.emoji_unicode, r.count
+        FROM message m
+        LEFT JOIN (
+            SELECT message, emoji_id, emoji_unicode, count(*) AS count
+            FROM reaction
+            WHERE message = ANY(%(ids)s)
+            GROUP BY 1, 2, 3
+            UNION ALL
+            SELECT message, emoji_id, emoji_unicode, count
+            FROM reaction_count
+            WHERE message = ANY(%(ids)s)
+        ) r ON r.message = m.message_id
+        WHERE m.message_id = ANY(%(ids)s)
+        """,
+        {"ids": message_ids},
+    )
+
+    counts: dict[int, Counter[tuple[int | None, str | None]]] = {}
+    for message_id, emoji_id, emoji_unicode, count in cursor.fetchall():
+        counter = counts.setdefault(message_id, Counter())
+        if count is not None:
+            counter[(emoji_id, emoji_unicode)] += count
+
+    return counts
+
+
+def sync_reactions(cursor: Cursor, snapshots: list[ReactionSnapshot]) -> None:
+    """Make the indexed reactions of each message match its snapshot.
+
+    Only the differing rows are written. Reactions the snapshot has no users
+    for are left as they are, since there is nothing to compare them against.
+    """
+    latest = {snapshot.message_id: snapshot for snapshot in snapshots}
+
+    cursor.execute(
+        "SELECT message_id, channel_id FROM message WHERE message_id = ANY(%s)",
+        (sorted(latest),),
+    )
+    channels: dict[int, int] = dict(cursor.fetchall())
+    if not channels:
+        return  # none of the messages are indexed
+
+    cursor.execute(
+        """
+        SELECT message, user_id, emoji_id, emoji_unicode, id, "timestamp"
+        FROM reaction
+        WHERE message = ANY(%s)
+        """,
+        (sorted(channels),),
+    )
+    existing: dict[ReactionKey, tuple[int, datetime]] = {
+        (row[0], row[1], row[2], row[3]): (row[4], row[5]) for row in cursor.fetchall()
+    }
+
+    wanted: dict[ReactionKey, datetime] = {}
+    unknown: set[tuple[int, int | None, str | None]] = set()
+    for message_id in channels:
+        snapshot = latest[message_id]
+        for reaction in snapshot.reactions:
+            if reaction.users is None:
+                unknown.add((message_id, reaction.emoji_id, reaction.emoji_unicode))
+                continue
+
+            for user_id in reaction.users:
+                key = (message_id, user_id, reaction.emoji_id, reaction.emoji_unicode)
+                wanted[key] = snapshot.synced_at
+
+    removed = [
+        key
+        for key in existing
+        if key not in wanted and (key[0], key[2], key[3]) not in unknown
+    ]
+    added = [key for key in wanted if key not in existing]
+
+    rollups: Counter[RollupKey] = Counter()
+
+    if removed:
+        execute_values(
+            cursor,
+            """
+            DELETE FROM reaction AS r
+            USING (VALUES %s) AS v (id, "timestamp")
+            WHERE r.id = v.id AND r."timestamp" = v."timestamp"
+            """,
+            [existing[key] for key in removed],
+            page_size=PAGE_SIZE,
+        )
+        for key in removed:
+            timestamp = existing[key][1]
+            rollups[(hour_bucket(timestamp), channels[key[0]], key[1])] -= 1
+
+    if added:
+        # when a missed reaction was added is unknown, use when it was found
+        execute_values(
+            cursor,
+            """
+            INSERT INTO reaction (message, user_id, emoji_id, emoji_unicode, "timestamp")
+            VALUES %s
+            """,
+            [(*key, wanted[key]) for key in added],
+            page_size=PAGE_SIZE,
+        )
+        for key in added:
+            rollups[(hour_bucket(wanted[key]), channels[key[0]], key[1])] += 1
+
+    bump_rollups(cursor, reactions=rollups)
+
+    # aggregate counts are superseded by the user rows wherever users are known
+    cursor.execute(
+        "DELETE FROM reaction_count WHERE message = ANY(%s)", (sorted(channels),)
+    )
+    count_rows = [
+        (message_id, reaction.emoji_id, reaction.emoji_unicode, reaction.count)
+        for message_id in channels
+        for reaction in latest[message_id].reactions
+        if reaction.users is None
+    ]
+    if count_rows:
+        execute_values(
+            cursor,
+            """
+            INSERT INTO reaction_count (message, emoji_id, emoji_unicode, count)
+            VALUES %s
+            """,
+            count_rows,
+            page_size=PAGE_SIZE,
+        )
+
+
+def apply_edits(cursor: Cursor, edits: list[EditData]) -> None:
+    """Apply edits in order, recording every replaced version in the history.
+
+    Only messages whose content actually changed are updated, and their
+    mentions are diffed so that unchanged mention rows are left alone. Embeds
+    are compared separately, since link previews arrive as edits that don't
+    touch the content.
+    """
+    if not edits:
+        return
+
+    message_ids = sorted({edit.message_id for edit in edits})
+    cursor.execute(
+        """
+        SELECT message_id, content, author_id, "timestamp" FROM message
+        WHERE message_id = ANY(%s)
+        FOR UPDATE
+        """,
+        (message_ids,),
+    )
+    rows = cursor.fetchall()
+    current: dict[int, str | None] = {row[0]: row[1] for row in rows}
+    # (day, author) of each message, for the mention edges
+    sources: dict[int, tuple[datetime, int]] = {
+        row[0]: (day_bucket(row[3]), row[2]) for row in rows
+    }
+
+    history: list[tuple[int, str | None, datetime]] = []
+    latest: dict[int, EditData] = {}
+    for edit in edits:
+        if edit.message_id not in current:
+            continue  # message is not indexed, ignore edit
+
+        previous = current[edit.message_id]
+        if edit.content != previous:
+            history.append((edit.message_id, previous, edit.edited_at))
+            current[edit.message_id] = edit.content
+            latest[edit.message_id] = edit
+
+    # embeds change without the content changing, the last edit wins
+    sync_embeds(
+        cursor,
+        {
+            edit.message_id: edit.embeds
+            for edit in edits
+            if edit.message_id in current and edit.embeds is not None
+        },
+    )
+
+    if not latest:
+        return
+
+    execute_values(
+        cursor,
+        """
+        UPDATE message AS m SET content = v.content
+        FROM (VALUES %s) AS v (message_id, content)
+        WHERE m.message_id = v.message_id
+        """,
+        [(edit.message_id, edit.content) for edit in latest.values()],
+        page_size=PAGE_SIZE,
+    )
+    execute_values(
+        cursor,
+        "INSERT INTO message_edit (message, content, edited_at) VALUES %s",
+        history,
+        page_size=PAGE_SIZE,
+    )
+
+    # diff mentions against what is indexed
+    cursor.execute(
+        "SELECT message, mentioned_user_id FROM mention WHERE message = ANY(%s)",
+        (list(latest),),
+    )
+    indexed: set[tuple[int, int]] = set(cursor.fetchall())
+    wanted = {
+        (edit.message_id, uid) for edit in latest.values() for uid in edit.mentioned_ids
+    }
+
+    edges: Counter[EdgeKey] = Counter()
+    removed = indexed - wanted
+    added = wanted - indexed
+    for delta, changed in ((-1, removed), (1, added)):
+        for message_id, uid in changed:
+            day, author_id = sources[message_id]
+            if uid != author_id:
+                edges[(day, author_id, uid)] += delta
+
+    bump_edges(cursor, mentions=edges)
+
+    if removed:
+        execute_values(
+            cursor,
+            """
+            DELETE FROM mention AS m
+            USING (VALUES %s) AS v (message, mentioned_user_id)
+            WHERE m.message = v.message
+                AND m.mentioned_user_id = v.mentioned_user_id
+            """,
+            sorted(removed),
+            page_size=PAGE_SIZE,
+        )
+
+    if added:
+        execute_values(
+            cursor,
+            "INSERT INTO mention (message, mentioned_user_id) VALUES %s",
+            sorted(added),
+            page_size=PAGE_SIZE,
+        )
+
+
+def soft_delete_messages(cursor: Cursor, deletes: list[DeleteData]) -> None:
+    """Mark messages as deleted, keeping the earliest deletion time."""
+    deleted_at: dict[int, datetime] = {}
+    for delete in deletes:
+        for message_id in delete.message_ids:
+            deleted_at.setdefault(message_id, delete.deleted_at)
+
+    if not deleted_at:
+        return
+
+    execute_values(
+        cursor,
+        """
+        UPDATE message AS m SET deleted_at = v.deleted_at
+        FROM (VALUES %s) AS v (message_id, deleted_at)
+        WHERE m.message_id = v.message_id AND m.deleted_at IS NULL
+        """,
+        sorted(deleted_at.items()),
+        page_size=PAGE_SIZE,
+    )
+
+
+def search_messages(
+    cursor: Cursor,
+    query: SearchQuery,
+    before_id: int | None = None,
+    limit: int = 10,
+) -> list[SearchResult]:
+    """Full-text search, newest first, paginated by message id.
+
+    Message ids are snowflakes and therefore sorted by time, so they double as
+    the keyset cursor and as the bounds of the date range filter.
+    """
+    conditions = [
+        "content_tsv @@ websearch_to_tsquery('pg_catalog.english', %s)",
+        "deleted_at IS NULL",
+    ]
+    params: list[object] = [query.text]
+
+    if query.author_id is not None:
+        conditions.append("author_id = %s")
+        params.append(query.author_id)
+    if query.channel_id is not None:
+        conditions.append("channel_id = %s")
+        params.append(query.channel_id)
+    if query.thread_id is not None:
+        conditions.append("thread_id = %s")
+        params.append(query.thread_id)
+    if query.after_id is not None:
+        conditions.append("message_id > %s")
+        params.append(query.after_id)
+    if before_id is not None or query.before_id is not None:
+        conditions.append("message_id < %s")
+        params.append(min(i for i in (before_id, query.before_id) if i is not None))
+
+    cursor.execute(
+        f"""
+        SELECT message_id, author_id, channel_id, thread_id, content, "timestamp"
+        FROM message
+        WHERE {" AND ".join(conditions)}
+        ORDER BY message_id DESC
+        LIMIT %s
+        """,
+        [*params, limit],
+    )
+
+    return [
+        SearchResult(
+            message_id=row[0],
+            author_id=row[1],
+            channel_id=row[2],
+            thread_id=row[3],
+            content=row[4],
+            timestamp=row[5],
+        )
+        for row in cursor.fetchall()
+    ]
+
+
+def rebuild_rollups(cursor: Cursor) -> None:
+    """Recompute every activity rollup from the message and reaction tables."""
+    # TRUNCATE locks the table, so live ingestion waits until the rebuild
+    # commits and then adds its own deltas on top
+    cursor.execute("TRUNCATE activity_rollup")
+    cursor.execute(
+        """
+        INSERT INTO activity_rollup (bucket, channel_id, user_id, messages, reactions)
+        SELECT date_trunc('hour', "timestamp"), channel_id, author_id, count(*), 0
+        FROM message
+        GROUP BY 1, 2, 3
+        """
+    )
+    cursor.execute(
+        """
+        INSERT INTO activity_rollup (bucket, channel_id, user_id, messages, reactions)
+        SELECT date_trunc('hour', r."timestamp"), m.channel_id, r.user_id, 0, count(*)
+        FROM reaction r
+        JOIN message m ON m.message_id = r.message
+        GROUP BY 1, 2, 3
+        ON CONFLICT (bucket, channel_id, user_id) DO UPDATE SET
+            reactions = EXCLUDED.reactions
+        """
+    )
+
+
+def rebuild_interactions(cursor: Cursor) -> None:
+    """Recompute every interaction edge from the message and mention tables."""
+    cursor.execute("TRUNCATE interaction_edge")
+    cursor.execute(
+        """
+        INSERT INTO interaction_edge (
+            bucket, source_user_id, target_user_id, replies, mentions
+        )
+        SELECT date_trunc('day', m."timestamp"), m.author_id, p.author_id, count(*), 0
+        FROM message m
+        JOIN message p ON p.message_id = m.reply_to
+        WHERE m.reply_to IS NOT NULL AND m.author_id <> p.author_id
+        GROUP BY 1, 2, 3
+        """
+    )
+    cursor.execute(
+        """
+        INSERT INTO interaction_edge (
+            bucket, source_user_id, target_user_id, replies, mentions
+        )
+        SELECT date_trunc('day', m."timestamp"), m.author_id, mn.mentioned_user_id,
+            0, count(*)
+        FROM mention mn
+        JOIN message m ON m.message_id = mn.message
+        WHERE m.author_id <> mn.mentioned_user_id
+        GROUP BY 1, 2, 3
+        ON CONFLICT (bucket, source_user_id, target_user_id) DO UPDATE SET
+            mentions = EXCLUDED.mentions
+        """
+    )
+
+
+def top_pairs(
+    cursor: Cursor, since: datetime, limit: int = 10
+) -> list[tuple[int, int, int, int]]:
+    """Pairs of users who interact the most, in either direction.
+
+    Returns (user_id, other_id, replies, mentions), ordered by replies and
+    mentions combined.
+    """
+    cursor.execute(
+        """
+        SELECT least(source_user_id, target_user_id),
+            greatest(source_user_id, target_user_id),
+            sum(replies), sum(mentions)
+        FROM interaction_edge
+        WHERE bucket >= %s
+        GROUP BY 1, 2
+        ORDER BY sum(replies + mentions) DESC
+        LIMIT %s
+        """,
+        (day_bucket(since), limit),
+    )
+    return [
+        (int(user_id), int(other_id), int(replies), int(mentions))
+        for user_id, other_id, replies, mentions in cursor.fetchall()
+    ]
+
+
+def user_interactions(
+    cursor: Cursor, user_id: int, since: datetime, limit: int = 10
+) -> list[tuple[int, int, int]]:
+    """Who a user interacts with the most.
+
+    Returns (other_id, outgoing, incoming), counting replies and mentions
+    together, ordered by the total.
+    """
+    cursor.execute(
+        """
+        SELECT other_id, sum(outgoing), sum(incoming)
+        FROM (
+            SELECT target_user_id AS other_id, replies + mentions AS outgoing,
+                0 AS incoming
+            FROM interaction_edge
+            WHERE source_user_id = %(user_id)s AND bucket >= %(since)s
+            UNION ALL
+            SELECT source_user_id, 0, replies + mentions
+            FROM interaction_edge
+            WHERE target_user_id = %(user_id)s AND bucket >= %(since)s
+        ) edges
+        GROUP BY 1
+        ORDER BY sum(outgoing + incoming) DESC
+        LIMIT %(limit)s
+        """,
+        {"user_id": user_id, "since": day_bucket(since), "limit": limit},
+    )
+    return [
+        (int(other_id), int(outgoing), int(incoming))
+        for other_id, outgoing, incoming in cursor.fetchall()
+    ]
+
+
+def reply_chain(
+    cursor: Cursor, message_id: int, limit: int = 25
+) -> list[tuple[int, SearchResult]]:
+    """The replies leading up to a message and the replies to it.
+
+    Returns (depth, message) in time order, where depth is negative for the
+    messages it replies to, zero for the message itself and positive for
+    replies. Both directions follow the reply_to index, one level at a time.
+    Messages closest to the given one are kept when there are more than
+    `limit`.
+    """
+    cursor.execute(
+        """
+        WITH RECURSIVE ancestors AS (
+            SELECT message_id, reply_to, 0 AS depth
+            FROM message
+            WHERE message_id = %(message_id)s
+            UNION ALL
+            SELECT m.message_id, m.reply_to, a.depth - 1
+            FROM message m
+            JOIN ancestors a ON m.message_id = a.reply_to
+            WHERE a.depth > -%(limit)s
+        ),
+        replies AS (
+            SELECT message_id, 0 AS depth
+            FROM message
+            WHERE message_id = %(message_id)s
+            UNION ALL
+            SELECT m.message_id, r.depth + 1
+            FROM message m
+            JOIN replies r ON m.reply_to = r.message_id
+            WHERE r.depth < %(limit)s
+        ),
+        chain AS (
+            SELECT message_id, depth FROM ancestors
+            UNION
+            SELECT message_id, depth FROM replies
+        )
+        SELECT c.depth, m.message_id, m.author_id, m.channel_id, m.thread_id,
+            m.content, m."timestamp"
+        FROM chain c
+        JOIN message m ON m.message_id = c.message_id
+        WHERE m.deleted_at IS NULL
+        ORDER BY abs(c.depth), m.message_id
+        LIMIT %(limit)s
+        """,
+        {"message_id": message_id, "limit": limit},
+    )
+    chain = [
+        (
+            row[0],
+            SearchResult(
+                message_id=row[1],
+                author_id=row[2],
+                channel_id=row[3],
+                thread_id=row[4],
+                content=row[5] or "",
+                timestamp=row[6],
+            ),
+        )
+        for row in cursor.fetchall()
+    ]
+    return sorted(chain, key=lambda item: item[1].message_id)
+
+
+def activity_summary(
+    cursor: Cursor, since: datetime, user_id: int | None = None, limit: int = 10
+) -> ActivitySummary:
+    """Top users, channels and hours of the day since a point in time."""
+    user_filter = "AND user_id = %(user_id)s" if user_id is not None else ""
+    params = {"since": since, "user_id": user_id, "limit": limit}
+
+    def rows(group_by: str, order_by: str) -> list[tuple[int, int, int]]:
+        cursor.execute(
+            f"""
+            SELECT {group_by}, sum(messages), sum(reactions)
+            FROM activity_rollup
+            WHERE bucket >= %(since)s {user_filter}
+            GROUP BY 1
+            ORDER BY {order_by} DESC
+            LIMIT %(limit)s
+            """,
+            params,
+        )
+        return [(int(row[0]), int(row[1]), int(row[2])) for row in cursor.fetchall()]
+
+    cursor.execute(
+        f"""
+        SELECT coalesce(sum(messages), 0), coalesce(sum(reactions), 0)
+        FROM activity_rollup
+        WHERE bucket >= %(since)s {user_filter}
+        """,
+        params,
+    )
+    messages, reactions = cursor.fetchone() or (0, 0)
+
+    return ActivitySummary(
+        messages=int(messages),
+        reactions=int(reactions),
+        users=rows("user_id", "2"),
+        channels=rows("channel_id", "2"),
+        hours=rows("extract(hour FROM bucket)", "2"),
+    )
+
+
+def media_summary(cursor: Cursor, after_id: int, limit: int = 10) -> MediaSummary:
+    """Attachment, sticker and link preview stats for messages after a snowflake.
+
+    Attachment and message ids are both snowflakes, so the time range is a
+    plain id range and needs no join against the message table.
+    """
+    params = {"after_id": after_id, "limit": limit}
+
+    cursor.execute(
+        """
+        SELECT coalesce(nullif(split_part(content_type, ';', 1), ''), 'unknown'),
+            count(*), sum(size)
+        FROM attachment
+        WHERE attachment_id >= %(after_id)s
+        GROUP BY 1
+        ORDER BY 2 DESC
+        """,
+        params,
+    )
+    content_types = [
+        (content_type, int(count), int(size))
+        for content_type, count, size in cursor.fetchall()
+    ]
+
+    cursor.execute(
+        """
+        SELECT name, count(*)
+        FROM message_sticker
+        WHERE message >= %(after_id)s
+        GROUP BY sticker_id, name
+        ORDER BY 2 DESC
+        LIMIT %(limit)s
+        """,
+        params,
+    )
+    stickers = [(name, int(count)) for name, count in cursor.fetchall()]
+
+    cursor.execute(
+        """
+        SELECT provider, count(*)
+        FROM embed
+        WHERE message >= %(after_id)s AND provider IS NOT NULL
+        GROUP BY 1
+        ORDER BY 2 DESC
+        LIMIT %(limit)s
+        """,
+        params,
+    )
+    providers = [(provider, int(count)) for provider, count in cursor.fetchall()]
+
+    return MediaSummary(
+        attachments=sum(count for _, count, _ in content_types),
+        bytes=sum(size for _, _, size in content_types),
+        content_types=content_types[:limit],
+        stickers=stickers,
+        providers=providers,
+    )
@@ -0,0 +1,240 @@
+# pyright: reportUnknownMemberType=false, reportMissingTypeStubs=false, reportMissingImports=false
+
+"""Columnar export of the message index for offline analysis.
+
+Rows are streamed out of Postgres through server-side cursors and written one
+record batch at a time, into one file per table per month:
+
+    <out>/message/month=2025-01/part-0.parquet
+
+Each month is read in its own short transaction, which keeps the export from
+holding back vacuum on a live database, and only touches the matching table
+partitions. Re-exporting a month replaces its files, so an incremental export
+rewrites the months from `since` onwards and leaves older ones alone.
+
+pyarrow is only needed here, so it isn't a dependency of the bot. Run the
+export with `uv run --with pyarrow`.
+"""
+
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass
+from datetime import UTC, date, datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Literal
+
+import psycopg2
+from psycopg2.extensions import connection as Connection
+
+from utils.index.models import connection_params
+from utils.index.partitions import add_months, month_start
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+# rows per record batch, and per round trip to the server-side cursor
+EXPORT_BATCH_SIZE = 50_000
+
+ExportFormat = Literal["parquet", "arrow"]
+
+
+@dataclass
+class ExportTable:
+    name: str
+    # selects the table's rows for the month between %(start)s and %(end)s
+    query: str
+    columns: list[tuple[str, str]]  # (name, arrow type)
+
+
+EXPORT_TABLES: list[ExportTable] = [
+    ExportTable(
+        name="message",
+        query="""
+        SELECT message_id, author_id, is_bot, channel_id, thread_id, content,
+            "timestamp", reply_to, deleted_at
+        FROM message
+        WHERE "timestamp" >= %(start)s AND "timestamp" < %(end)s
+        """,
+        columns=[
+            ("message_id", "int64"),
+            ("author_id", "int64"),
+            ("is_bot", "bool"),
+            ("channel_id", "int64"),
+            ("thread_id", "int64"),
+            ("content", "string"),
+            ("timestamp", "timestamp"),
+            ("reply_to", "int64"),
+            ("deleted_at", "timestamp"),
+        ],
+    ),
+    ExportTable(
+        name="mention",
+        # mentions have no timestamp of their own, they go with their message
+        query="""
+        SELECT mn.message, mn.mentioned_user_id, m."timestamp"
+        FROM mention mn
+        JOIN message m ON m.message_id = mn.message
+        WHERE m."timestamp" >= %(start)s AND m."timestamp" < %(end)s
+        """,
+        columns=[
+            ("message", "int64"),
+            ("mentioned_user_id", "int64"),
+            ("timestamp", "timestamp"),
+        ],
+    ),
+    ExportTable(
+        name="reaction",
+        query="""
+        SELECT message, user_id, emoji_id, emoji_unicode, "timestamp"
+        FROM reaction
+        WHERE "timestamp" >= %(start)s AND "timestamp" < %(end)s
+        """,
+        columns=[
+            ("message", "int64"),
+            ("user_id", "int64"),
+            ("emoji_id", "int64"),
+            ("emoji_unicode", "string"),
+            ("timestamp", "timestamp"),
+        ],
+    ),
+]
+
+
+def _import_pyarrow() -> Any:
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError(
+            "Exporting needs pyarrow, run with `uv run --with pyarrow`"
+        ) from None
+
+    return pyarrow
+
+
+def _schema(pa: Any, table: ExportTable) -> "pa.Schema":
+    types = {
+        "int64": pa.int64(),
+        "bool": pa.bool_(),
+        "string": pa.string(),
+        "timestamp": pa.timestamp("us"),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in table.columns])
+
+
+def _batches(
+    conn: Connection, table: ExportTable, start: datetime, end: datetime
+) -> Iterator[list[tuple[Any, ...]]]:
+    # a named cursor lives on the server and only sends rows as they are fetched
+    with conn.cursor(name=f"export_{table.name}") as cursor:
+        cursor.itersize = EXPORT_BATCH_SIZE
+        cursor.execute(table.query, {"start": start, "end": end})
+
+        while rows := cursor.fetchmany(EXPORT_BATCH_SIZE):
+            yield rows
+
+
+@dataclass
+class ExportStats:
+    rows: dict[str, int]
+    files: int = 0
+    seconds: float = 0.0
+
+    def __str__(self) -> str:
+        rows = ", ".join(f"{count} {name} rows" for name, count in self.rows.items())
+        return f"{rows} in {self.files} files, {self.seconds:.1f}s"
+
+
+def export_month(
+    conn: Connection,
+    table: ExportTable,
+    month: datetime,
+    out: Path,
+    file_format: ExportFormat,
+    stats: ExportStats,
+) -> None:
+    pa = _import_pyarrow()
+    schema = _schema(pa, table)
+
+    directory = out / table.name / f"month={month:%Y-%m}"
+    path = directory / f"part-0.{file_format}"
+    partial = path.with_suffix(".partial")
+
+    writer = None
+    try:
+        for rows in _batches(conn, table, month, add_months(month, 1)):
+            columns = list(zip(*rows))
+            batch = pa.RecordBatch.from_arrays(
+                [
+                    pa.array(column, type=field.type)
+                    for column, field in zip(columns, schema)
+                ],
+                schema=schema,
+            )
+
+            if writer is None:
+                directory.mkdir(parents=True, exist_ok=True)
+                writer = (
+                    pa.parquet.ParquetWriter(str(partial), schema)
+                    if file_format == "parquet"
+                    else pa.ipc.new_file(str(partial), schema)
+                )
+
+            writer.write_batch(batch)
+            stats.rows[table.name] += len(rows)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is not None:
+        # only replace the previous export once the new file is complete
+        partial.replace(path)
+        stats.files += 1
+    elif path.exists():
+        path.unlink()  # the month is empty now
+
+
+def export_index(
+    out: Path,
+    since: date | None = None,
+    file_format: ExportFormat = "parquet",
+    tables: list[str] | None = None,
+) -> ExportStats:
+    """Export every month from `since`, or from the oldest message, until now."""
+    _import_pyarrow()
+
+    selected = [t for t in EXPORT_TABLES if tables is None or t.name in tables]
+    stats = ExportStats(rows={table.name: 0 for table in selected})
+    start_time = time.perf_counter()
+
+    conn = psycopg2.connect(**connection_params)
+    conn.set_session(readonly=True)
+
+    try:
+        if since is None:
+            with conn, conn.cursor() as cursor:
+                cursor.execute('SELECT min("timestamp") FROM message')
+                row = cursor.fetchone()
+                oldest: datetime | None = row[0] if row else None
+        else:
+            oldest = datetime.combine(since, datetime.min.time())
+
+        if oldest is None:
+            return stats  # nothing indexed yet
+
+        month = month_start(oldest)
+        last = month_start(datetime.now(UTC))
+        while month <= last:
+            # one short transaction per month
+            with conn:
+                for table in selected:
+                    export_month(conn, table, month, out, file_format, stats)
+
+            print(f"Exported {month:%Y-%m}")
+            month = add_months(month, 1)
+    finally:
+        conn.close()
+
+    stats.seconds = time.perf_counter() - start_time
+    return stats
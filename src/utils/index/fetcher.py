@@ -0,0 +1,129 @@
+import asyncio
+from collections import OrderedDict
+
+import discord
+from discord.ext import commands
+
+from utils.index.utils import RateLimiter, ReactionEvent, collect_message_data
+from utils.index.writer import WRITE_ERRORS, IndexWriter, MessageBatch
+
+# messages fetched per second, well under the global limit shared with backfills
+FETCHES_PER_SECOND = 2
+FETCH_WORKERS = 2
+MAX_PENDING = 1_000
+
+# how many fetched or unfetchable message ids to remember
+RECENT_SIZE = 10_000
+
+
+class UnindexedMessageFetcher:
+    """Indexes messages that receive reactions before they were backfilled.
+
+    The writer hands over reaction events whose message isn't indexed. Each
+    such message is fetched once, indexed with its full reaction state, and
+    the reaction events that arrived in the meantime are replayed on top.
+    """
+
+    def __init__(self, bot: commands.Bot, writer: IndexWriter) -> None:
+        self.bot: commands.Bot = bot
+        self.writer: IndexWriter = writer
+        self.fetched: int = 0
+        self.failed: int = 0
+
+        # message id -> events waiting for it, in arrival order
+        self._pending: dict[int, list[ReactionEvent]] = {}
+        self._queue: asyncio.Queue[tuple[int, int]] = asyncio.Queue()
+        # message id -> whether it ended up indexed
+        self._recent: OrderedDict[int, bool] = OrderedDict()
+        self._rate_limiter: RateLimiter = RateLimiter(FETCHES_PER_SECOND)
+        self._workers: list[asyncio.Task[None]] = []
+
+    def start(self) -> None:
+        if not self._workers:
+            self._workers = [
+                asyncio.create_task(self._run()) for _ in range(FETCH_WORKERS)
+            ]
+
+    def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+
+    @property
+    def queued(self) -> int:
+        return len(self._pending)
+
+    def request(self, events: list[ReactionEvent]) -> None:
+        """Queue the messages of `events` for fetching, at most once each."""
+        for event in events:
+            if event.message_id in self._pending:
+                self._pending[event.message_id].append(event)
+                continue
+
+            if self._recent.get(event.message_id) is False:
+                continue  # couldn't be fetched, the event is dropped
+
+            if len(self._pending) >= MAX_PENDING:
+                continue  # shed load rather than queue fetches forever
+
+            # a message that was fetched recently is only replayed on, see _run
+            self._pending[event.message_id] = [event]
+            self._queue.put_nowait((event.channel_id, event.message_id))
+
+    def _remember(self, message_id: int, indexed: bool) -> None:
+        self._recent[message_id] = indexed
+        self._recent.move_to_end(message_id)
+        while len(self._recent) > RECENT_SIZE:
+            self._recent.popitem(last=False)
+
+    async def _fetch(self, channel_id: int, message_id: int) -> discord.Message | None:
+        channel = self.bot.get_channel(channel_id)
+        try:
+            if channel is None:
+                await self._rate_limiter.acquire()
+                channel = await self.bot.fetch_channel(channel_id)
+
+            if not isinstance(channel, discord.TextChannel | discord.Thread):
+                return None
+
+            await self._rate_limiter.acquire()
+            return await channel.fetch_message(message_id)
+        except (discord.NotFound, discord.Forbidden):
+            return None
+
+    async def _run(self) -> None:
+        while True:
+            channel_id, message_id = await self._queue.get()
+
+            try:
+                if self._recent.get(message_id):
+                    # raced with the fetch, by now the message is indexed. if
+                    # the replay misses it again it was deleted since
+                    events = self._pending.pop(message_id, [])
+                    self._remember(message_id, False)
+                    await self.writer.write(MessageBatch([], reactions=events))
+                    continue
+
+                message = await self._fetch(channel_id, message_id)
+                if message is None:
+                    self.failed += 1
+                    self._remember(message_id, False)
+                    self._pending.pop(message_id, None)
+                    continue
+
+                message_data = await collect_message_data(
+                    [message], rate_limiter=self._rate_limiter
+                )
+
+                # the fetched reactions mostly include the pending events
+                # already, replaying them covers anything that changed while
+                # the reaction users were being fetched
+                self._remember(message_id, True)
+                events = self._pending.pop(message_id, [])
+                await self.writer.write(MessageBatch(message_data, reactions=events))
+                self.fetched += 1
+            except (discord.HTTPException, *WRITE_ERRORS) as e:
+                print(f"Error while indexing message {message_id}: {e}")
+                self.failed += 1
+                self._remember(message_id, False)
+                self._pending.pop(message_id, None)
@@ -0,0 +1,269 @@
+# pyright: reportUnknownMemberType=false, reportMissingTypeStubs=false
+
+"""Offline import of DiscordChatExporter JSON archives into the index.
+
+Exports can be several gigabytes, so they are never loaded whole. The reader
+walks the top-level object key by key and decodes the `messages` array one
+element at a time, keeping only a small window of the file in memory.
+"""
+
+import json
+import re
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import discord
+import psycopg2
+
+from utils.index.database import insert_messages
+from utils.index.models import connection_params
+from utils.index.utils import (
+    AttachmentData,
+    EmbedData,
+    MessageData,
+    ReactionData,
+    StickerData,
+)
+
+CHUNK_SIZE = 1 << 20
+
+# give up on a single value larger than this rather than reading the whole
+# rest of a corrupt file into memory
+MAX_VALUE_SIZE = 64 << 20
+
+IMPORT_BATCH_SIZE = 1000
+
+THREAD_TYPES = {"GuildPublicThread", "GuildPrivateThread", "GuildNewsThread"}
+
+# exporter sticker formats, named like discord.StickerFormatType
+STICKER_FORMATS = {
+    "Png": "png",
+    "PngAnimated": "apng",
+    "Lottie": "lottie",
+    "Gif": "gif",
+}
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class ExportReader:
+    """Incrementally decodes the top level of a chat export."""
+
+    def __init__(self, path: Path) -> None:
+        self.path: Path = path
+        self.header: dict[str, Any] = {}
+
+        self._decoder: json.JSONDecoder = json.JSONDecoder()
+        self._file = path.open(encoding="utf-8")
+        self._buffer: str = ""
+        self._pos: int = 0
+        self._eof: bool = False
+
+    def close(self) -> None:
+        self._file.close()
+
+    def _fill(self) -> bool:
+        # drop what has been consumed and read the next chunk
+        chunk = self._file.read(CHUNK_SIZE)
+        self._buffer = self._buffer[self._pos :] + chunk
+        self._pos = 0
+        self._eof = not chunk
+        return bool(chunk)
+
+    def _skip_whitespace(self) -> None:
+        while True:
+            match = _WHITESPACE.match(self._buffer, self._pos)
+            self._pos = match.end() if match else self._pos
+            if self._pos < len(self._buffer) or not self._fill():
+                return
+
+    def _expect(self, token: str) -> str:
+        self._skip_whitespace()
+        char = self._buffer[self._pos : self._pos + 1]
+        if not char or char not in token:
+            raise ValueError(f"Expected one of {token!r} in {self.path}, got {char!r}")
+
+        self._pos += 1
+        return char
+
+    def _decode(self) -> Any:
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # a number at the end of the buffer might continue in the next
+                # chunk, so only trust values that something follows
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+
+            if len(self._buffer) - self._pos > MAX_VALUE_SIZE:
+                raise ValueError(f"Value in {self.path} is too large to import")
+            self._fill()
+
+    def messages(self) -> Iterator[dict[str, Any]]:
+        """Yield every message, filling in `header` with the keys before them."""
+        self._expect("{")
+        if self._expect('"}') == "}":
+            return
+        self._pos -= 1
+
+        while True:
+            key = self._decode()
+            self._expect(":")
+
+            if key == "messages":
+                self._expect("[")
+                self._skip_whitespace()
+                if self._buffer[self._pos : self._pos + 1] == "]":
+                    self._pos += 1
+                else:
+                    while True:
+                        yield self._decode()
+                        if self._expect(",]") == "]":
+                            break
+            else:
+                self.header[key] = self._decode()
+
+            if self._expect(",}") == "}":
+                return
+
+
+def message_from_export(
+    channel: dict[str, Any], message: dict[str, Any]
+) -> MessageData:
+    """Convert an exported message to the same rows the bot would index."""
+    message_id = int(message["id"])
+
+    if channel.get("type") in THREAD_TYPES:
+        thread_id = int(channel["id"])
+        channel_id = int(channel["categoryId"])
+    else:
+        thread_id = None
+        channel_id = int(channel["id"])
+
+    reference = message.get("reference") or {}
+    reply_to = reference.get("messageId")
+
+    reactions: list[ReactionData] = []
+    for reaction in message.get("reactions", []):
+        emoji = reaction["emoji"]
+        reactions.append(
+            ReactionData(
+                # unicode emojis have an empty id
+                emoji_id=int(emoji["id"]) if emoji.get("id") else None,
+                emoji_unicode=None if emoji.get("id") else emoji["name"],
+                count=reaction["count"],
+                users=[int(user["id"]) for user in reaction["users"]]
+                if "users" in reaction
+                else None,
+            )
+        )
+
+    attachments = [
+        AttachmentData(
+            attachment_id=int(attachment["id"]),
+            filename=attachment["fileName"],
+            # the exporter doesn't keep content types or dimensions
+            content_type=None,
+            size=attachment.get("fileSizeBytes", 0),
+            width=None,
+            height=None,
+            url=attachment["url"],
+        )
+        for attachment in message.get("attachments", [])
+    ]
+
+    embeds = [
+        EmbedData(
+            type=None,
+            url=embed.get("url"),
+            title=embed.get("title"),
+            provider=None,
+        )
+        for embed in message.get("embeds", [])
+    ]
+
+    stickers = [
+        StickerData(
+            sticker_id=int(sticker["id"]),
+            name=sticker["name"],
+            format=STICKER_FORMATS.get(sticker["format"], sticker["format"].lower()),
+        )
+        for sticker in message.get("stickers", [])
+    ]
+
+    return MessageData(
+        message_id=message_id,
+        author_id=int(message["author"]["id"]),
+        is_bot=message["author"].get("isBot", False),
+        channel_id=channel_id,
+        thread_id=thread_id,
+        content=message.get("content", ""),
+        # derived from the id rather than parsed, so that it matches the
+        # partition key of the same message indexed live
+        timestamp=discord.utils.snowflake_time(message_id),
+        reply_to=int(reply_to) if reply_to else None,
+        mentioned_ids=[int(user["id"]) for user in message.get("mentions", [])],
+        reactions=reactions,
+        attachments=attachments,
+        embeds=embeds,
+        stickers=stickers,
+    )
+
+
+@dataclass
+class ImportStats:
+    read: int = 0
+    inserted: int = 0
+    seconds: float = 0.0
+
+    def __str__(self) -> str:
+        rate = self.read / self.seconds if self.seconds else 0
+        return (
+            f"{self.read} messages read, {self.inserted} new "
+            f"in {self.seconds:.1f}s ({rate:.0f}/s)"
+        )
+
+
+def import_export(path: Path, batch_size: int = IMPORT_BATCH_SIZE) -> ImportStats:
+    """Stream one export file into the index, one transaction per batch.
+
+    Messages that are already indexed are skipped, so re-running an import or
+    importing overlapping exports is safe.
+    """
+    stats = ImportStats()
+    start = time.perf_counter()
+
+    reader = ExportReader(path)
+    conn = psycopg2.connect(**connection_params)
+
+    def flush(batch: list[MessageData]) -> None:
+        with conn, conn.cursor() as cursor:
+            stats.inserted += len(insert_messages(cursor, batch))
+        batch.clear()
+
+    try:
+        batch: list[MessageData] = []
+        for message in reader.messages():
+            batch.append(message_from_export(reader.header["channel"], message))
+            stats.read += 1
+
+            if len(batch) >= batch_size:
+                flush(batch)
+                print(f"{path.name}: {stats.read} messages read", end="\r")
+
+        if batch:
+            flush(batch)
+    finally:
+        reader.close()
+        conn.close()
+
+    stats.seconds = time.perf_counter() - start
+    return stats
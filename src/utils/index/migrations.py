@@ -0,0 +1,410 @@
+# pyright: reportUnknownMemberType=false, reportMissingTypeStubs=false
+
+"""Versioned schema migrations for the message index.
+
+Pony creates the tables, and migrations add what Pony can't express, such as
+secondary indexes or table partitioning. Migrations run against a live database, so they follow a
+few rules to avoid blocking the bot's writes:
+
+- indexes are built with `CREATE INDEX CONCURRENTLY` in `concurrent` migrations
+- new columns are nullable without a default, which only touches the catalog
+- existing rows are backfilled in small `batched` transactions
+- every statement runs with a short `lock_timeout` and is retried instead of
+  queueing behind long-running queries
+"""
+
+import re
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+import psycopg2
+from psycopg2 import errors
+from psycopg2.extensions import connection as Connection
+from psycopg2.extensions import cursor as Cursor
+
+from utils.index.database import rebuild_interactions
+from utils.index.models import connection_params
+from utils.index.partitions import (
+    REACTION_UNIQUE_KEY,
+    create_partitioned_index,
+    partition_tables,
+)
+
+# arbitrary key so that only one process migrates at a time
+ADVISORY_LOCK_KEY = 0x63657275
+
+LOCK_TIMEOUT = "5s"
+LOCK_RETRIES = 5
+
+# the index name in a CREATE INDEX CONCURRENTLY statement
+INDEX_NAME = re.compile(r"INDEX\s+CONCURRENTLY\s+(?:IF NOT EXISTS\s+)?(\w+)")
+
+
+def _backfill_interactions(conn: Connection) -> None:
+    # the table is new and the writer isn't running yet, so one transaction is
+    # fine even on a large index
+    conn.autocommit = False
+    try:
+        with conn, conn.cursor() as cursor:
+            rebuild_interactions(cursor)
+    finally:
+        conn.autocommit = True
+
+
+def _unique_reactions(conn: Connection) -> None:
+    with conn.cursor() as cursor:
+        # the rollups counted these twice as well, /rebuildactivity fixes them
+        _execute_with_retry(
+            cursor,
+            """
+            DELETE FROM reaction r
+            USING reaction d
+            WHERE r.message = d.message
+                AND r.user_id = d.user_id
+                AND r.emoji_id IS NOT DISTINCT FROM d.emoji_id
+                AND r.emoji_unicode IS NOT DISTINCT FROM d.emoji_unicode
+                AND r."timestamp" = d."timestamp"
+                AND r.id > d.id
+            """,
+        )
+
+    create_partitioned_index(
+        conn, "reaction", "idx_reaction_unique", REACTION_UNIQUE_KEY, unique=True
+    )
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    statements: list[str] = field(default_factory=list)
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction, so concurrent
+    # migrations run statement by statement and must be safe to re-run
+    concurrent: bool = False
+    # batched migrations repeat each statement in its own short transaction
+    # until it stops changing rows, for backfilling large tables
+    batched: bool = False
+    # for migrations that can't be expressed as a list of statements, called
+    # with an autocommit connection and responsible for its own transactions
+    run: Callable[[Connection], None] | None = None
+
+    @property
+    def index_names(self) -> list[str]:
+        """Names of the indexes this migration creates."""
+        return [
+            match.group(1)
+            for statement in self.statements
+            if (match := INDEX_NAME.search(statement))
+        ]
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(
+        version=1,
+        name="query indexes",
+        concurrent=True,
+        statements=[
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_message_channel_timestamp
+            ON message (channel_id, "timestamp")
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_message_author_timestamp
+            ON message (author_id, "timestamp")
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_message_thread_timestamp
+            ON message (thread_id, "timestamp")
+            WHERE thread_id IS NOT NULL
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_message_reply_to
+            ON message (reply_to)
+            WHERE reply_to IS NOT NULL
+            """,
+            # messages are inserted roughly in time order, so a tiny BRIN index
+            # is enough for server-wide time range scans
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_message_timestamp_brin
+            ON message USING brin ("timestamp")
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_mention_user
+            ON mention (mentioned_user_id, message)
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reaction_user_timestamp
+            ON reaction (user_id, "timestamp")
+            """,
+        ],
+    ),
+    Migration(
+        version=2,
+        name="full-text search column",
+        statements=[
+            "ALTER TABLE message ADD COLUMN IF NOT EXISTS content_tsv tsvector",
+            # keeps the column current on every insert and edit, whichever
+            # code path writes the message
+            "DROP TRIGGER IF EXISTS message_content_tsv_update ON message",
+            """
+            CREATE TRIGGER message_content_tsv_update
+            BEFORE INSERT OR UPDATE OF content ON message
+            FOR EACH ROW EXECUTE FUNCTION
+            tsvector_update_trigger(content_tsv, 'pg_catalog.english', content)
+            """,
+        ],
+    ),
+    Migration(
+        version=3,
+        name="backfill full-text search column",
+        batched=True,
+        statements=[
+            """
+            UPDATE message
+            SET content_tsv = to_tsvector('pg_catalog.english', coalesce(content, ''))
+            WHERE message_id IN (
+                SELECT message_id FROM message
+                WHERE content_tsv IS NULL
+                LIMIT 5000
+            )
+            """,
+        ],
+    ),
+    Migration(
+        version=4,
+        name="full-text search index",
+        concurrent=True,
+        statements=[
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_message_content_tsv
+            ON message USING gin (content_tsv)
+            """,
+        ],
+    ),
+    Migration(
+        version=5,
+        name="partition message and reaction by month",
+        run=partition_tables,
+    ),
+    Migration(
+        version=6,
+        name="indexes replacing message foreign keys",
+        concurrent=True,
+        statements=[
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_mention_message
+            ON mention (message)
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reaction_count_message
+            ON reaction_count (message)
+            """,
+        ],
+    ),
+    Migration(
+        version=7,
+        name="edit history index",
+        concurrent=True,
+        statements=[
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_message_edit_message
+            ON message_edit (message, edited_at)
+            """,
+        ],
+    ),
+    Migration(
+        version=8,
+        name="soft-deleted messages",
+        statements=[
+            # not part of the pony model, which would otherwise fail its table
+            # check on startup before this migration gets to run
+            "ALTER TABLE message ADD COLUMN IF NOT EXISTS deleted_at timestamp",
+        ],
+    ),
+    Migration(
+        version=9,
+        name="backfill interaction edges",
+        run=_backfill_interactions,
+    ),
+    Migration(
+        version=10,
+        name="interaction edge indexes",
+        concurrent=True,
+        statements=[
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_interaction_edge_source
+            ON interaction_edge (source_user_id, bucket)
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_interaction_edge_target
+            ON interaction_edge (target_user_id, bucket)
+            """,
+        ],
+    ),
+    Migration(
+        version=11,
+        name="media indexes",
+        concurrent=True,
+        statements=[
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_attachment_message
+            ON attachment (message)
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_embed_message
+            ON embed (message)
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_message_sticker_message
+            ON message_sticker (message)
+            """,
+        ],
+    ),
+    Migration(
+        version=12,
+        name="unique reactions",
+        run=_unique_reactions,
+    ),
+]
+
+
+def _execute_with_retry(cursor: Cursor, statement: str) -> None:
+    for attempt in range(LOCK_RETRIES):
+        try:
+            cursor.execute(statement)
+            return
+        except errors.LockNotAvailable:
+            if attempt == LOCK_RETRIES - 1:
+                raise
+
+            print("Migration statement timed out waiting for a lock, retrying")
+            time.sleep(2**attempt)
+
+
+def _drop_invalid_indexes(cursor: Cursor, names: list[str]) -> None:
+    # an interrupted concurrent build leaves an invalid index behind, which
+    # IF NOT EXISTS would otherwise happily skip. only the migration's own
+    # indexes are dropped, another invalid one may be a build in progress
+    if not names:
+        return
+
+    cursor.execute(
+        """
+        SELECT c.relname
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE NOT i.indisvalid
+            AND n.nspname = current_schema()
+            AND c.relname = ANY(%s)
+        """,
+        (names,),
+    )
+    for (name,) in cursor.fetchall():
+        print(f"Dropping invalid index {name}")
+        cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+def _apply(conn: Connection, migration: Migration) -> None:
+    if migration.run:
+        conn.autocommit = True
+        migration.run(conn)
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                (migration.version, migration.name),
+            )
+        return
+
+    if migration.batched:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            for statement in migration.statements:
+                while True:
+                    _execute_with_retry(cursor, statement)
+                    if cursor.rowcount <= 0:
+                        break
+
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                (migration.version, migration.name),
+            )
+        return
+
+    if migration.concurrent:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            _drop_invalid_indexes(cursor, migration.index_names)
+            for statement in migration.statements:
+                _execute_with_retry(cursor, statement)
+
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                (migration.version, migration.name),
+            )
+        return
+
+    conn.autocommit = False
+    for attempt in range(LOCK_RETRIES):
+        try:
+            with conn.cursor() as cursor:
+                for statement in migration.statements:
+                    cursor.execute(statement)
+
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                    (migration.version, migration.name),
+                )
+            conn.commit()
+            return
+        except errors.LockNotAvailable:
+            conn.rollback()
+            if attempt == LOCK_RETRIES - 1:
+                raise
+
+            print("Migration timed out waiting for a lock, retrying")
+            time.sleep(2**attempt)
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def run_migrations() -> int:
+    """Apply all pending migrations and return the current schema version."""
+    conn = psycopg2.connect(**connection_params)
+    conn.autocommit = True
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", (ADVISORY_LOCK_KEY,))
+            cursor.execute(f"SET lock_timeout = '{LOCK_TIMEOUT}'")
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+                """
+            )
+            cursor.execute("SELECT version FROM schema_migrations")
+            applied = {row[0] for row in cursor.fetchall()}
+
+        for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+            if migration.version in applied:
+                continue
+
+            print(f"Applying migration {migration.version}: {migration.name}")
+            start = time.perf_counter()
+            _apply(conn, migration)
+            applied.add(migration.version)
+            print(
+                f"Applied migration {migration.version} "
+                f"in {time.perf_counter() - start:.1f}s"
+            )
+
+        return max(applied, default=0)
+    finally:
+        # closing the session releases the advisory lock
+        conn.close()
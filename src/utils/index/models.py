@@ -1,13 +1,12 @@
 import os
 from datetime import datetime
-from typing import final
+from typing import cast, final
 
 from pony.orm import (
     Database,
     Optional,
     PrimaryKey,
     Required,
-    Set,
     composite_key,
 )
 
@@ -22,15 +21,17 @@ if not all([user, password, host, port, database]):
         "One or more required PostgreSQL environment variables are not set"
     )
 
+# shared with the raw psycopg2 connections used outside of pony
+connection_params: dict[str, str] = {
+    "user": cast(str, user),
+    "password": cast(str, password),
+    "host": cast(str, host),
+    "port": cast(str, port),
+    "database": cast(str, database),
+}
+
 db = Database()
-db.bind(
-    provider="postgres",
-    user=user,
-    password=password,
-    host=host,
-    port=port,
-    database=database,
-)
+db.bind(provider="postgres", **connection_params)
 
 
 @final
@@ -43,28 +44,136 @@ class Message(db.Entity):
     content = Optional(str)
     timestamp = Required(datetime)
     reply_to = Optional(int, size=64)
-    mentions = Set("Mention")  # pyright: ignore[reportUnknownVariableType]
-    reactions = Set("Reaction")  # pyright: ignore[reportUnknownVariableType]
+
+
+# message and reaction are partitioned by month (see utils/index/partitions.py),
+# and foreign keys can't reference a partitioned table, so the tables below
+# store plain message ids instead of relationships to Message
 
 
 @final
 class Reaction(db.Entity):
-    message = Required(Message)
+    message = Required(int, size=64)
     user_id = Required(int, size=64)
 
     emoji_id = Optional(int, size=64)  # null for Unicode emojis
     emoji_unicode = Optional(str)  # null for custom emojis
 
-    timestamp = Required(datetime)
+    timestamp = Required(datetime)  # partition key
+
+    # a unique key would have to include the timestamp, so the index writer
+    # ensures a user only reacts once per emoji per message
+
+
+@final
+class ReactionCount(db.Entity):
+    """Aggregate reaction count for messages indexed without reaction users."""
+
+    _table_ = "reaction_count"
+
+    message = Required(int, size=64)
+
+    emoji_id = Optional(int, size=64)  # null for Unicode emojis
+    emoji_unicode = Optional(str)  # null for custom emojis
+
+    count = Required(int)
 
-    # ensure a user can only react once per emoji per message
-    composite_key(message, user_id, emoji_id, emoji_unicode)
+    composite_key(message, emoji_id, emoji_unicode)
 
 
 @final
 class Mention(db.Entity):
-    message = Required(Message)
+    message = Required(int, size=64)
     mentioned_user_id = Required(int, size=64)
 
 
+@final
+class Attachment(db.Entity):
+    attachment_id = PrimaryKey(int, size=64)
+    message = Required(int, size=64)
+
+    filename = Required(str)
+    content_type = Optional(str)  # null when discord couldn't tell
+    size = Required(int, size=64)  # bytes
+    width = Optional(int)  # images and videos only
+    height = Optional(int)
+    url = Required(str)
+
+
+@final
+class Embed(db.Entity):
+    message = Required(int, size=64)
+
+    type = Optional(str)  # null for imported embeds
+    url = Optional(str)
+    title = Optional(str)
+    provider = Optional(str)
+
+
+@final
+class MessageSticker(db.Entity):
+    _table_ = "message_sticker"
+
+    message = Required(int, size=64)
+    sticker_id = Required(int, size=64)
+    name = Required(str)
+    format = Required(str)
+
+
+@final
+class MessageEdit(db.Entity):
+    """Append-only history of edited messages, one row per replaced version."""
+
+    _table_ = "message_edit"
+
+    message = Required(int, size=64)
+    content = Optional(str)  # content before the edit
+    edited_at = Required(datetime)
+
+
+@final
+class IndexCheckpoint(db.Entity):
+    _table_ = "index_checkpoint"
+
+    channel_id = PrimaryKey(int, size=64)  # thread id for threads
+    last_message_id = Required(int, size=64)
+    last_timestamp = Required(datetime)
+
+    # set once the backfill reached the end of the channel, after which live
+    # messages keep the checkpoint current
+    complete = Required(bool, default=False)
+
+
+@final
+class ActivityRollup(db.Entity):
+    """Hourly message and reaction counts, maintained during ingestion."""
+
+    _table_ = "activity_rollup"
+
+    bucket = Required(datetime)  # start of the hour
+    channel_id = Required(int, size=64)  # parent channel for threads
+    user_id = Required(int, size=64)
+
+    messages = Required(int, size=64, default=0)  # messages sent
+    reactions = Required(int, size=64, default=0)  # reactions given
+
+    PrimaryKey(bucket, channel_id, user_id)
+
+
+@final
+class InteractionEdge(db.Entity):
+    """Daily reply and mention counts between two users, maintained during ingestion."""
+
+    _table_ = "interaction_edge"
+
+    bucket = Required(datetime)  # start of the day
+    source_user_id = Required(int, size=64)  # who replied or mentioned
+    target_user_id = Required(int, size=64)  # who was replied to or mentioned
+
+    replies = Required(int, size=64, default=0)
+    mentions = Required(int, size=64, default=0)
+
+    PrimaryKey(bucket, source_user_id, target_user_id)
+
+
 db.generate_mapping(create_tables=True)
@@ -0,0 +1,451 @@
+# pyright: reportUnknownMemberType=false, reportMissingTypeStubs=false
+
+"""Monthly range partitioning of the message and reaction tables.
+
+Both tables are partitioned on "timestamp", one partition per calendar month,
+so that time-bounded queries only touch the partitions they need and vacuum
+works on one month at a time. Postgres requires the partition key in every
+unique constraint, which makes the primary keys (message_id, "timestamp") and
+(id, "timestamp"). Message timestamps are derived from the snowflake, so the
+pair is exactly as unique as the id alone.
+
+Partitions are created ahead of time by `ensure_partitions`, and a default
+partition catches anything outside of them rather than failing the insert.
+"""
+
+import time
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+
+import discord
+import psycopg2
+from psycopg2 import errors
+from psycopg2.extensions import connection as Connection
+from psycopg2.extensions import cursor as Cursor
+
+from utils.ids import Meta
+from utils.index.models import connection_params
+
+# how many months of empty partitions to keep ahead of the current one
+MONTHS_AHEAD = 3
+
+# rows copied per transaction while converting an existing table
+COPY_BATCH_SIZE = 5000
+
+LOCK_TIMEOUT = "5s"
+LOCK_RETRIES = 5
+
+# a reaction is indexed once. the writer checks before inserting, and this
+# catches whatever slips past it. nullable emoji columns need NULLS NOT
+# DISTINCT, which postgres has since 15
+REACTION_UNIQUE_KEY = (
+    '(message, user_id, emoji_id, emoji_unicode, "timestamp") NULLS NOT DISTINCT'
+)
+
+
+@dataclass
+class PartitionedTable:
+    name: str
+    # unique column used to copy and mirror rows during the conversion
+    key: str
+    primary_key: list[str]
+    # index name -> everything after `ON <table>`
+    indexes: dict[str, str] = field(default_factory=dict)
+    # same, for unique indexes, which have to include "timestamp"
+    unique_indexes: dict[str, str] = field(default_factory=dict)
+    # recreated on the new table when it replaces the old one
+    triggers: list[str] = field(default_factory=list)
+
+
+PARTITIONED_TABLES: list[PartitionedTable] = [
+    PartitionedTable(
+        name="message",
+        key="message_id",
+        primary_key=["message_id", '"timestamp"'],
+        indexes={
+            "idx_message_channel_timestamp": '(channel_id, "timestamp")',
+            "idx_message_author_timestamp": '(author_id, "timestamp")',
+            "idx_message_thread_timestamp": (
+                '(thread_id, "timestamp") WHERE thread_id IS NOT NULL'
+            ),
+            "idx_message_reply_to": "(reply_to) WHERE reply_to IS NOT NULL",
+            "idx_message_timestamp_brin": 'USING brin ("timestamp")',
+            "idx_message_content_tsv": "USING gin (content_tsv)",
+        },
+        triggers=[
+            """
+            CREATE TRIGGER message_content_tsv_update
+            BEFORE INSERT OR UPDATE OF content ON message
+            FOR EACH ROW EXECUTE FUNCTION
+            tsvector_update_trigger(content_tsv, 'pg_catalog.english', content)
+            """,
+        ],
+    ),
+    PartitionedTable(
+        name="reaction",
+        key="id",
+        primary_key=["id", '"timestamp"'],
+        indexes={
+            "idx_reaction_message_user": "(message, user_id)",
+            "idx_reaction_user_timestamp": '(user_id, "timestamp")',
+        },
+        unique_indexes={"idx_reaction_unique": REACTION_UNIQUE_KEY},
+    ),
+]
+
+# copies every change made to the old table into the new one while the
+# existing rows are being copied over
+MIRROR_FUNCTION = """
+CREATE OR REPLACE FUNCTION mirror_to_partitioned() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        EXECUTE format('DELETE FROM %I WHERE %I = ($1).%I', TG_ARGV[0], TG_ARGV[1], TG_ARGV[1])
+        USING OLD;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        EXECUTE format('INSERT INTO %I SELECT ($1).* ON CONFLICT DO NOTHING', TG_ARGV[0])
+        USING NEW;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+def month_start(timestamp: datetime) -> datetime:
+    return datetime(timestamp.year, timestamp.month, 1)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    years, month_index = divmod(month.month - 1 + months, 12)
+    return datetime(month.year + years, month_index + 1, 1)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+
+def _execute_with_retry(cursor: Cursor, statement: str) -> None:
+    for attempt in range(LOCK_RETRIES):
+        try:
+            cursor.execute(statement)
+            return
+        except errors.LockNotAvailable:
+            if attempt == LOCK_RETRIES - 1:
+                raise
+
+            print("Partition statement timed out waiting for a lock, retrying")
+            time.sleep(2**attempt)
+
+
+def is_partitioned(cursor: Cursor, table: str) -> bool:
+    cursor.execute(
+        """
+        SELECT 1 FROM pg_partitioned_table p
+        JOIN pg_class c ON c.oid = p.partrelid
+        WHERE c.relname = %s AND c.relnamespace = current_schema()::regnamespace
+        """,
+        (table,),
+    )
+    return cursor.fetchone() is not None
+
+
+def create_partitions(
+    cursor: Cursor, table: str, parent: str, first: datetime, last: datetime
+) -> list[str]:
+    """Create the monthly partitions of `parent` from `first` through `last`.
+
+    Partitions are named after `table`, which differs from `parent` only while
+    a table is being converted. Returns the names of the new partitions.
+    """
+    created: list[str] = []
+    month = month_start(first)
+
+    while month <= last:
+        name = partition_name(table, month)
+        cursor.execute("SELECT to_regclass(%s)", (name,))
+        row = cursor.fetchone()
+
+        if row is None or row[0] is None:
+            next_month = add_months(month, 1)
+            _execute_with_retry(
+                cursor,
+                f"""
+                CREATE TABLE {name} PARTITION OF {parent}
+                FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month:%Y-%m-%d}')
+                """,
+            )
+            created.append(name)
+
+        month = add_months(month, 1)
+
+    return created
+
+
+def ensure_partitions(months_ahead: int = MONTHS_AHEAD) -> list[str]:
+    """Make sure partitions exist up to `months_ahead` months from now.
+
+    Safe to call repeatedly, and does nothing for tables that haven't been
+    partitioned yet. Returns the names of the partitions it created.
+    """
+    conn = psycopg2.connect(**connection_params)
+    conn.autocommit = True
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SET lock_timeout = '{LOCK_TIMEOUT}'")
+
+            now = month_start(datetime.now(UTC))
+            created: list[str] = []
+            for table in PARTITIONED_TABLES:
+                if is_partitioned(cursor, table.name):
+                    created += create_partitions(
+                        cursor,
+                        table.name,
+                        table.name,
+                        now,
+                        add_months(now, months_ahead),
+                    )
+
+            return created
+    finally:
+        conn.close()
+
+
+def _first_month(cursor: Cursor, table: PartitionedTable) -> datetime:
+    # nothing in the server predates the server itself, but imported or
+    # clock-skewed rows might, so take whichever is older
+    first = discord.utils.snowflake_time(Meta.SERVER.value).replace(tzinfo=None)
+
+    cursor.execute(f'SELECT min("timestamp") FROM {table.name}')
+    row = cursor.fetchone()
+    if row and row[0] is not None:
+        first = min(first, row[0].replace(tzinfo=None))
+
+    return month_start(first)
+
+
+def _swap(conn: Connection, table: PartitionedTable, new: str) -> None:
+    old = f"{table.name}_unpartitioned"
+
+    conn.autocommit = False
+    for attempt in range(LOCK_RETRIES):
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+                cursor.execute(
+                    f"LOCK TABLE {table.name}, {new} IN ACCESS EXCLUSIVE MODE"
+                )
+                cursor.execute(f"DROP TRIGGER {table.name}_mirror ON {table.name}")
+
+                # keep the id sequence alive when the old table is dropped
+                cursor.execute(
+                    "SELECT pg_get_serial_sequence(%s, %s)", (table.name, table.key)
+                )
+                row = cursor.fetchone()
+                sequence = row[0] if row else None
+                if sequence:
+                    cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY NONE")
+
+                cursor.execute(f"ALTER TABLE {table.name} RENAME TO {old}")
+                cursor.execute(f"ALTER TABLE {new} RENAME TO {table.name}")
+                cursor.execute(f"DROP TABLE {old}")
+
+                # the old names are free now that the old table is gone
+                cursor.execute(
+                    f"ALTER TABLE {table.name} "
+                    f"RENAME CONSTRAINT {new}_pkey TO {table.name}_pkey"
+                )
+                for index in [*table.indexes, *table.unique_indexes]:
+                    cursor.execute(f"ALTER INDEX {index}_new RENAME TO {index}")
+
+                if sequence:
+                    cursor.execute(
+                        f"ALTER SEQUENCE {sequence} OWNED BY {table.name}.{table.key}"
+                    )
+
+                for trigger in table.triggers:
+                    cursor.execute(trigger)
+
+            conn.commit()
+            return
+        except errors.LockNotAvailable:
+            conn.rollback()
+            if attempt == LOCK_RETRIES - 1:
+                raise
+
+            print(f"Swapping {table.name} timed out waiting for a lock, retrying")
+            time.sleep(2**attempt)
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def partition_table(conn: Connection, table: PartitionedTable) -> None:
+    """Convert a live table into a partitioned one without blocking writes.
+
+    The new table is built next to the old one, a trigger mirrors every write
+    to the old table into it while the existing rows are copied over in small
+    batches, and the two are swapped in one short transaction at the end.
+    Expects an autocommit connection.
+    """
+    new = f"{table.name}_partitioned"
+
+    with conn.cursor() as cursor:
+        cursor.execute(f"SET lock_timeout = '{LOCK_TIMEOUT}'")
+
+        if is_partitioned(cursor, table.name):
+            return
+
+        # foreign keys can't point at a partitioned table without the partition
+        # key, so the tables referencing this one lose theirs
+        cursor.execute(
+            """
+            SELECT conname, conrelid::regclass::text FROM pg_constraint
+            WHERE confrelid = %s::regclass AND contype = 'f'
+            """,
+            (table.name,),
+        )
+        for constraint, referencing in cursor.fetchall():
+            _execute_with_retry(
+                cursor, f'ALTER TABLE {referencing} DROP CONSTRAINT "{constraint}"'
+            )
+
+        # start over if a previous attempt was interrupted
+        _execute_with_retry(
+            cursor, f"DROP TRIGGER IF EXISTS {table.name}_mirror ON {table.name}"
+        )
+        cursor.execute(f"DROP TABLE IF EXISTS {new}")
+
+        # the new table isn't live yet, so its indexes are built up front
+        # rather than concurrently
+        cursor.execute(
+            f"""
+            CREATE TABLE {new} (
+                LIKE {table.name} INCLUDING DEFAULTS,
+                PRIMARY KEY ({", ".join(table.primary_key)})
+            ) PARTITION BY RANGE ("timestamp")
+            """
+        )
+        now = month_start(datetime.now(UTC))
+        create_partitions(
+            cursor,
+            table.name,
+            new,
+            _first_month(cursor, table),
+            add_months(now, MONTHS_AHEAD),
+        )
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {table.name}_default PARTITION OF {new} DEFAULT"
+        )
+        for index, definition in table.indexes.items():
+            cursor.execute(f"CREATE INDEX {index}_new ON {new} {definition}")
+        for index, definition in table.unique_indexes.items():
+            cursor.execute(f"CREATE UNIQUE INDEX {index}_new ON {new} {definition}")
+
+        cursor.execute(MIRROR_FUNCTION)
+        _execute_with_retry(
+            cursor,
+            f"""
+            CREATE TRIGGER {table.name}_mirror
+            AFTER INSERT OR UPDATE OR DELETE ON {table.name}
+            FOR EACH ROW EXECUTE FUNCTION
+            mirror_to_partitioned('{new}', '{table.key}')
+            """,
+        )
+
+        # copy existing rows, locking each batch so that a concurrent update
+        # can't be mirrored before the batch's older copy of the row lands
+        last = -1
+        copied = 0
+        while True:
+            cursor.execute(
+                f"""
+                WITH batch AS (
+                    SELECT * FROM {table.name}
+                    WHERE {table.key} > %s
+                    ORDER BY {table.key}
+                    LIMIT %s
+                    FOR SHARE
+                ), copied AS (
+                    INSERT INTO {new} SELECT * FROM batch ON CONFLICT DO NOTHING
+                )
+                SELECT max({table.key}), count(*) FROM batch
+                """,
+                (last, COPY_BATCH_SIZE),
+            )
+            row = cursor.fetchone()
+            if row is None or row[0] is None:
+                break
+
+            last = row[0]
+            copied += row[1]
+
+        print(f"Copied {copied} rows into the partitioned {table.name} table")
+
+    try:
+        _swap(conn, table, new)
+    finally:
+        conn.autocommit = True
+
+
+def create_partitioned_index(
+    conn: Connection, table: str, name: str, definition: str, unique: bool = False
+) -> None:
+    """Build an index on a partitioned table without blocking writes.
+
+    Postgres can't build an index on a partitioned table concurrently, so the
+    index is created on the parent alone, where it starts out invalid, and
+    each partition's index is built concurrently and attached to it. The
+    parent index becomes valid once every partition has one. Safe to re-run.
+    Expects an autocommit connection.
+    """
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+
+    with conn.cursor() as cursor:
+        cursor.execute(f"SET lock_timeout = '{LOCK_TIMEOUT}'")
+        _execute_with_retry(
+            cursor, f"CREATE {kind} IF NOT EXISTS {name} ON ONLY {table} {definition}"
+        )
+
+        # partitions created since come with the index already attached
+        cursor.execute(
+            """
+            SELECT p.inhrelid::regclass::text FROM pg_inherits p
+            WHERE p.inhparent = %(table)s::regclass
+                AND NOT EXISTS (
+                    SELECT 1 FROM pg_inherits i
+                    JOIN pg_index x ON x.indexrelid = i.inhrelid
+                    WHERE i.inhparent = %(index)s::regclass
+                        AND x.indrelid = p.inhrelid
+                )
+            """,
+            {"table": table, "index": name},
+        )
+        for (partition,) in cursor.fetchall():
+            index = f"{name}_{partition.removeprefix(f'{table}_')}"
+
+            # an interrupted concurrent build leaves an invalid index behind
+            cursor.execute(
+                "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)",
+                (index,),
+            )
+            row = cursor.fetchone()
+            if row is not None and not row[0]:
+                _execute_with_retry(cursor, f"DROP INDEX CONCURRENTLY {index}")
+
+            _execute_with_retry(
+                cursor,
+                f"CREATE {kind} CONCURRENTLY IF NOT EXISTS {index} "
+                f"ON {partition} {definition}",
+            )
+            _execute_with_retry(cursor, f"ALTER INDEX {name} ATTACH PARTITION {index}")
+
+
+def partition_tables(conn: Connection) -> None:
+    """Partition every table in `PARTITIONED_TABLES` that isn't already."""
+    for table in PARTITIONED_TABLES:
+        partition_table(conn, table)
+
+    with conn.cursor() as cursor:
+        cursor.execute("DROP FUNCTION IF EXISTS mirror_to_partitioned()")
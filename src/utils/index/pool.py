@@ -0,0 +1,140 @@
+# pyright: reportUnknownMemberType=false, reportMissingTypeStubs=false
+
+import asyncio
+import os
+import threading
+import time
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, Concatenate
+
+from psycopg2.extensions import connection as Connection
+from psycopg2.extensions import cursor as Cursor
+from psycopg2.pool import ThreadedConnectionPool
+
+from utils.index.models import connection_params
+
+POOL_MIN_SIZE = int(os.getenv("PGPOOL_MIN_SIZE", default="1"))
+POOL_MAX_SIZE = int(os.getenv("PGPOOL_MAX_SIZE", default="8"))
+
+
+class PreparedConnection(Connection):
+    """A connection that remembers which statements it has prepared."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.prepared: set[str] = set()
+
+
+@dataclass
+class PoolStats:
+    min_size: int = 0
+    max_size: int = 0
+    in_use: int = 0
+    waiting: int = 0
+    acquired: int = 0
+    # acquisitions that had to wait for a connection to be returned
+    waits: int = 0
+    wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+
+    @property
+    def saturation(self) -> float:
+        return self.in_use / self.max_size if self.max_size else 0.0
+
+
+class DatabasePool:
+    """Async access to a pool of raw psycopg2 connections.
+
+    Connections are handed out to coroutines, never more than `max_size` at a
+    time, and queries run on worker threads so that they never block the event
+    loop and can overlap with each other. The pool connects lazily, on first
+    use.
+    """
+
+    def __init__(
+        self, min_size: int = POOL_MIN_SIZE, max_size: int = POOL_MAX_SIZE
+    ) -> None:
+        self.min_size: int = min_size
+        self.max_size: int = max_size
+        self.stats: PoolStats = PoolStats(min_size=min_size, max_size=max_size)
+
+        self._pool: ThreadedConnectionPool | None = None
+        self._lock: threading.Lock = threading.Lock()
+        self._semaphore: asyncio.Semaphore = asyncio.Semaphore(max_size)
+
+    def _getconn(self) -> Connection:
+        # runs on a worker thread, opening a connection can take a while
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadedConnectionPool(
+                    self.min_size,
+                    self.max_size,
+                    connection_factory=PreparedConnection,
+                    **connection_params,
+                )
+
+        return self._pool.getconn()
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[Connection]:
+        """Borrow a connection, waiting for one to be returned if all are in use.
+
+        The connection is returned to the pool afterwards, and any transaction
+        left open on it is rolled back.
+        """
+        start = time.perf_counter()
+        if self._semaphore.locked():
+            self.stats.waits += 1
+
+        self.stats.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.stats.waiting -= 1
+
+        waited = time.perf_counter() - start
+        self.stats.wait_seconds += waited
+        self.stats.max_wait_seconds = max(self.stats.max_wait_seconds, waited)
+
+        try:
+            conn = await asyncio.to_thread(self._getconn)
+        except Exception:
+            self._semaphore.release()
+            raise
+
+        self.stats.acquired += 1
+        self.stats.in_use += 1
+        try:
+            yield conn
+        finally:
+            self.stats.in_use -= 1
+            if self._pool is not None:
+                self._pool.putconn(conn, close=bool(conn.closed))
+            self._semaphore.release()
+
+    async def run[**P, T](
+        self,
+        fn: Callable[Concatenate[Cursor, P], T],
+        *args: P.args,
+        **kwargs: P.kwargs,
+    ) -> T:
+        """Call `fn(cursor, *args, **kwargs)` on a worker thread in one transaction."""
+
+        def transaction(conn: Connection) -> T:
+            with conn, conn.cursor() as cursor:
+                return fn(cursor, *args, **kwargs)
+
+        async with self.connection() as conn:
+            return await asyncio.to_thread(transaction, conn)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+
+
+# shared by the index writer and every index query
+pool = DatabasePool()
@@ -0,0 +1,133 @@
+import asyncio
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import discord
+
+from utils.index.database import read_reaction_counts
+from utils.index.scheduler import (
+    BATCH_SIZE,
+    GLOBAL_REQUESTS_PER_SECOND,
+    IndexableChannel,
+)
+from utils.index.utils import (
+    RateLimiter,
+    ReactionData,
+    ReactionSnapshot,
+    collect_message_data,
+)
+from utils.index.writer import WRITE_ERRORS, IndexWriter, MessageBatch
+
+# how far back reactions are checked after a restart
+RECONCILE_WINDOW = timedelta(hours=48)
+
+
+@dataclass
+class ReconcileStats:
+    checked: int = 0
+    missing: int = 0
+    mismatched: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.checked} messages checked • {self.missing} missing • "
+            f"{self.mismatched} with changed reactions"
+        )
+
+
+def reaction_counts(message: discord.Message) -> Counter[tuple[int | None, str | None]]:
+    counts: Counter[tuple[int | None, str | None]] = Counter()
+    for reaction in message.reactions:
+        data = ReactionData.from_reaction(reaction)
+        if data:
+            counts[(data.emoji_id, data.emoji_unicode)] = data.count
+
+    return counts
+
+
+async def reconcile_channel(
+    channel: IndexableChannel,
+    writer: IndexWriter,
+    since: datetime,
+    rate_limiter: RateLimiter | None = None,
+    stats: ReconcileStats | None = None,
+) -> ReconcileStats:
+    """Bring the indexed reactions of a channel's recent messages up to date.
+
+    History pages already carry the count of every reaction, so they are
+    compared against the index first, and reaction users are only fetched for
+    messages whose counts differ. Messages missing from the index are indexed
+    as they are.
+    """
+    stats = stats or ReconcileStats()
+    buffer: list[discord.Message] = []
+
+    async def process_batch() -> None:
+        indexed = await writer.pool.run(
+            read_reaction_counts, [message.id for message in buffer]
+        )
+
+        missing = [message for message in buffer if message.id not in indexed]
+        changed = [
+            message
+            for message in buffer
+            if message.id in indexed and indexed[message.id] != reaction_counts(message)
+        ]
+        stats.checked += len(buffer)
+        stats.missing += len(missing)
+        stats.mismatched += len(changed)
+        buffer.clear()
+
+        if missing:
+            await writer.write(
+                MessageBatch(
+                    await collect_message_data(missing, rate_limiter=rate_limiter)
+                )
+            )
+
+        if changed:
+            synced_at = discord.utils.utcnow()
+            for data in await collect_message_data(changed, rate_limiter=rate_limiter):
+                await writer.submit(
+                    ReactionSnapshot(data.message_id, data.reactions, synced_at)
+                )
+
+    if rate_limiter:
+        await rate_limiter.acquire()
+
+    after = discord.Object(id=discord.utils.time_snowflake(since))
+    async for message in channel.history(limit=None, after=after, oldest_first=True):
+        buffer.append(message)
+
+        if len(buffer) >= BATCH_SIZE:
+            await process_batch()
+            if rate_limiter:
+                await rate_limiter.acquire()
+
+    if buffer:
+        await process_batch()
+
+    return stats
+
+
+async def reconcile_channels(
+    channels: list[IndexableChannel],
+    writer: IndexWriter,
+    since: datetime,
+    concurrency: int = 4,
+) -> ReconcileStats:
+    """Reconcile many channels concurrently under one global request budget."""
+    stats = ReconcileStats()
+    semaphore = asyncio.Semaphore(concurrency)
+    rate_limiter = RateLimiter(GLOBAL_REQUESTS_PER_SECOND)
+
+    async def run_one(channel: IndexableChannel) -> None:
+        async with semaphore:
+            try:
+                await reconcile_channel(channel, writer, since, rate_limiter, stats)
+            except (discord.HTTPException, *WRITE_ERRORS) as e:
+                print(f"Error while reconciling {channel.name}: {e}")
+
+    await asyncio.gather(*map(run_one, channels))
+    return stats
@@ -0,0 +1,266 @@
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import Literal
+
+import discord
+
+from utils.index.database import read_checkpoint
+from utils.index.utils import (
+    CheckpointData,
+    RateLimiter,
+    collect_message_data,
+    render_progress_bar,
+)
+from utils.index.writer import WRITE_ERRORS, IndexWriter, MessageBatch
+
+IndexableChannel = discord.TextChannel | discord.Thread
+
+BATCH_SIZE = 100
+
+# discord allows 50 requests per second globally, leave room for everything else
+GLOBAL_REQUESTS_PER_SECOND = 30
+
+
+@dataclass
+class StageTimings:
+    """Seconds spent in each stage of a backfill."""
+
+    history: float = 0.0
+    reactions: float = 0.0
+    write: float = 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"history {self.history:.1f}s • reactions {self.reactions:.1f}s • "
+            f"writes {self.write:.1f}s"
+        )
+
+
+async def backfill_channel(
+    channel: IndexableChannel,
+    writer: IndexWriter,
+    limit: int | None = None,
+    on_batch: Callable[[int], Awaitable[None]] | None = None,
+    rate_limiter: RateLimiter | None = None,
+    reaction_users: bool = True,
+    timings: StageTimings | None = None,
+    resume_from: CheckpointData | None = None,
+) -> int:
+    """Index a channel's history oldest first and return the number of messages.
+
+    Resumes after `resume_from` if given, otherwise after the channel's stored
+    checkpoint if it has one, and records a new checkpoint in the same
+    transaction as every batch. Time spent in each stage is added to `timings`
+    if given.
+    """
+    timings = timings or StageTimings()
+    checkpoint = resume_from or await writer.pool.run(read_checkpoint, channel.id)
+    after = discord.Object(id=checkpoint.last_message_id) if checkpoint else None
+
+    processed = 0
+    buffer: list[discord.Message] = []
+
+    async def process_batch(complete: bool = False):
+        nonlocal checkpoint
+
+        start = time.perf_counter()
+        message_data = await collect_message_data(buffer, reaction_users, rate_limiter)
+        timings.reactions += time.perf_counter() - start
+
+        if buffer:
+            checkpoint = CheckpointData(
+                channel_id=channel.id,
+                last_message_id=buffer[-1].id,
+                last_timestamp=buffer[-1].created_at,
+            )
+
+        if checkpoint:
+            checkpoint.complete = checkpoint.complete or complete
+
+        start = time.perf_counter()
+        await writer.write(MessageBatch(message_data, checkpoint=checkpoint))
+        timings.write += time.perf_counter() - start
+        buffer.clear()
+
+        if on_batch:
+            await on_batch(processed)
+
+    if rate_limiter:
+        await rate_limiter.acquire()
+
+    # process messages in batches, one history page per batch
+    page_start = time.perf_counter()
+    async for message in channel.history(limit=limit, after=after, oldest_first=True):
+        buffer.append(message)
+        processed += 1
+
+        if len(buffer) >= BATCH_SIZE:
+            timings.history += time.perf_counter() - page_start
+            await process_batch()
+
+            if rate_limiter:
+                await rate_limiter.acquire()
+            page_start = time.perf_counter()
+
+    timings.history += time.perf_counter() - page_start
+
+    # process remaining messages, and mark the channel as complete if the
+    # history ran out before the limit did
+    reached_end = limit is None or processed < limit
+    if buffer or (reached_end and checkpoint and not checkpoint.complete):
+        await process_batch(complete=reached_end)
+
+    return processed
+
+
+async def discover_channels(guild: discord.Guild) -> list[IndexableChannel]:
+    """Find every text channel, thread and forum post the bot can read."""
+    me = guild.me
+
+    def readable(channel: discord.abc.GuildChannel) -> bool:
+        permissions = channel.permissions_for(me)
+        return permissions.read_messages and permissions.read_message_history
+
+    channels: dict[int, IndexableChannel] = {}
+
+    for channel in guild.text_channels:
+        if readable(channel):
+            channels[channel.id] = channel
+
+    # active threads, including forum posts
+    for thread in await guild.active_threads():
+        if thread.parent and readable(thread.parent):
+            channels[thread.id] = thread
+
+    # archived threads and forum posts
+    parents: list[discord.TextChannel | discord.ForumChannel] = [
+        *guild.text_channels,
+        *guild.forums,
+    ]
+    for parent in parents:
+        if not readable(parent):
+            continue
+
+        try:
+            async for thread in parent.archived_threads(limit=None):
+                channels[thread.id] = thread
+
+            if (
+                isinstance(parent, discord.TextChannel)
+                and parent.permissions_for(me).manage_threads
+            ):
+                async for thread in parent.archived_threads(limit=None, private=True):
+                    channels[thread.id] = thread
+        except discord.Forbidden:
+            continue
+
+    return list(channels.values())
+
+
+@dataclass
+class ChannelProgress:
+    channel: IndexableChannel
+    processed: int = 0
+    status: Literal["pending", "running", "done", "failed"] = "pending"
+
+
+class BackfillScheduler:
+    """Backfills many channels concurrently and tracks their combined progress."""
+
+    def __init__(
+        self,
+        writer: IndexWriter,
+        channels: list[IndexableChannel],
+        concurrency: int = 4,
+        reaction_users: bool = True,
+        checkpoints: dict[int, CheckpointData] | None = None,
+    ) -> None:
+        self.writer: IndexWriter = writer
+        # where to resume each channel, instead of its stored checkpoint
+        self.checkpoints: dict[int, CheckpointData] = checkpoints or {}
+        self.concurrency: int = concurrency
+        self.reaction_users: bool = reaction_users
+        self.timings: StageTimings = StageTimings()
+        self.progress: list[ChannelProgress] = [
+            ChannelProgress(channel) for channel in channels
+        ]
+        self.start_time: float = time.time()
+
+    @property
+    def processed(self) -> int:
+        return sum(p.processed for p in self.progress)
+
+    def count(self, status: str) -> int:
+        return sum(1 for p in self.progress if p.status == status)
+
+    async def run(self) -> None:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        rate_limiter = RateLimiter(GLOBAL_REQUESTS_PER_SECOND)
+
+        async def run_one(progress: ChannelProgress) -> None:
+            async with semaphore:
+                progress.status = "running"
+
+                async def on_batch(processed: int) -> None:
+                    progress.processed = processed
+
+                try:
+                    progress.processed = await backfill_channel(
+                        progress.channel,
+                        self.writer,
+                        on_batch=on_batch,
+                        rate_limiter=rate_limiter,
+                        reaction_users=self.reaction_users,
+                        timings=self.timings,
+                        resume_from=self.checkpoints.get(progress.channel.id),
+                    )
+                    progress.status = "done"
+                except (discord.HTTPException, *WRITE_ERRORS) as e:
+                    print(f"Error while indexing {progress.channel.name}: {e}")
+                    progress.status = "failed"
+
+        await asyncio.gather(*map(run_one, self.progress))
+
+    def to_embed(self) -> discord.Embed:
+        total = len(self.progress)
+        finished = self.count("done") + self.count("failed")
+        elapsed = int(time.time() - self.start_time)
+        rate = self.processed / elapsed if elapsed else 0
+
+        embed = discord.Embed(
+            title="Indexing server",
+            description=(
+                f"{render_progress_bar(finished, total)}\n"
+                f"{finished}/{total} channels • {self.processed} messages "
+                f"({rate:.0f}/s)"
+            ),
+            color=discord.Color.green()
+            if finished == total
+            else discord.Color.orange(),
+        )
+
+        running = [p for p in self.progress if p.status == "running"]
+        if running:
+            embed.add_field(
+                name="In progress",
+                value="\n".join(
+                    f"{p.channel.mention}: {p.processed} messages" for p in running
+                ),
+                inline=False,
+            )
+
+        failed = [p for p in self.progress if p.status == "failed"]
+        if failed:
+            embed.add_field(
+                name="Failed",
+                value=", ".join(p.channel.mention for p in failed)[:1024],
+                inline=False,
+            )
+
+        embed.add_field(name="Time spent", value=str(self.timings), inline=False)
+        embed.set_footer(
+            text=f"Elapsed: {elapsed}s • {self.count('pending')} channels queued"
+        )
+        return embed
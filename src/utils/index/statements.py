@@ -0,0 +1,86 @@
+# pyright: reportUnknownMemberType=false, reportMissingTypeStubs=false
+
+"""Precompiled statements for the queries run on every live event.
+
+These used to go through Pony, which decompiles a lambda and materializes
+entities into its identity map on every call. Here each statement is prepared
+once per pooled connection, so postgres skips parsing and planning it, and
+results come back as plain tuples. `python bench.py statements`, run from the
+src directory, compares the two paths.
+"""
+
+from dataclasses import dataclass
+
+from psycopg2.extensions import cursor as Cursor
+
+
+@dataclass(frozen=True)
+class Statement:
+    name: str
+    types: tuple[str, ...]
+    query: str
+
+    def execute(self, cursor: Cursor, *params: object) -> None:
+        """Execute the statement, preparing it on the connection's first use.
+
+        Prepared statements belong to the connection, so this needs one from
+        the index pool, which tracks what each connection has prepared.
+        """
+        prepared: set[str] = cursor.connection.prepared  # pyright: ignore[reportAttributeAccessIssue]
+        if self.name not in prepared:
+            cursor.execute(
+                f"PREPARE {self.name} ({', '.join(self.types)}) AS {self.query}"
+            )
+            prepared.add(self.name)
+
+        placeholders = ", ".join(["%s"] * len(params))
+        cursor.execute(f"EXECUTE {self.name} ({placeholders})", params)
+
+
+MESSAGE_CHANNEL = Statement(
+    name="message_channel",
+    types=("bigint",),
+    query="SELECT channel_id FROM message WHERE message_id = $1",
+)
+
+REACTION_ADD = Statement(
+    name="reaction_add",
+    types=("bigint", "bigint", "bigint", "text", "timestamp"),
+    query="""
+    INSERT INTO reaction (message, user_id, emoji_id, emoji_unicode, "timestamp")
+    SELECT $1, $2, $3, $4, $5
+    WHERE NOT EXISTS (
+        SELECT 1 FROM reaction
+        WHERE message = $1 AND user_id = $2
+            AND emoji_id IS NOT DISTINCT FROM $3
+            AND emoji_unicode IS NOT DISTINCT FROM $4
+    )
+    ON CONFLICT DO NOTHING
+    RETURNING "timestamp"
+    """,
+)
+
+REACTION_REMOVE = Statement(
+    name="reaction_remove",
+    types=("bigint", "bigint", "bigint", "text"),
+    query="""
+    DELETE FROM reaction
+    WHERE message = $1 AND user_id = $2
+        AND emoji_id IS NOT DISTINCT FROM $3
+        AND emoji_unicode IS NOT DISTINCT FROM $4
+    RETURNING "timestamp"
+    """,
+)
+
+# a removed reaction whose users weren't fetched only exists as a count
+REACTION_COUNT_REMOVE = Statement(
+    name="reaction_count_remove",
+    types=("bigint", "bigint", "text"),
+    query="""
+    UPDATE reaction_count SET count = count - 1
+    WHERE message = $1
+        AND emoji_id IS NOT DISTINCT FROM $2
+        AND emoji_unicode IS NOT DISTINCT FROM $3
+        AND count > 0
+    """,
+)
@@ -1,12 +1,40 @@
 import asyncio
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Literal, cast
 
 import discord
-from pony.orm import db_session
 
-from utils.index.models import Mention, Message, Reaction
+from utils.ids import Meta
+
+# reaction user lists fetched at the same time during a backfill batch
+REACTION_FETCH_CONCURRENCY = 8
+# users per request when paging through a reaction's users
+REACTION_USERS_PAGE_SIZE = 100
+
+
+class RateLimiter:
+    """Spaces out requests so that concurrent backfills share one global budget.
+
+    discord.py already waits out per-route buckets, and every channel's history
+    lives in its own bucket, so this only needs to keep the combined request
+    rate under the global limit.
+    """
+
+    def __init__(self, per_second: float) -> None:
+        self.interval: float = 1 / per_second
+        self._next: float = 0.0
+        self._lock: asyncio.Lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+
+        if wait > 0:
+            await asyncio.sleep(wait)
 
 
 def render_progress_bar(current: int, total: int, bar_length: int = 20) -> str:
@@ -23,7 +51,78 @@ def render_progress_bar(current: int, total: int, bar_length: int = 20) -> str:
 class ReactionData:
     emoji_id: int | None
     emoji_unicode: str | None
-    users: list[int]
+    count: int
+    # None when the users weren't fetched and only the count is known
+    users: list[int] | None = None
+
+    @classmethod
+    def from_reaction(cls, reaction: discord.Reaction) -> "ReactionData | None":
+        emoji_id = None
+        emoji_unicode = None
+
+        if isinstance(reaction.emoji, str):
+            # unicode emoji
+            emoji_unicode = cast(str, reaction.emoji)  # pyright: ignore[reportUnnecessaryCast]
+        else:
+            # custom emoji
+            emoji = cast(discord.PartialEmoji | discord.Emoji, reaction.emoji)  # pyright: ignore[reportUnnecessaryCast]
+            emoji_id = emoji.id
+
+            if emoji_id is None:
+                return None  # deleted custom emoji
+
+        return cls(emoji_id=emoji_id, emoji_unicode=emoji_unicode, count=reaction.count)
+
+
+@dataclass
+class AttachmentData:
+    attachment_id: int
+    filename: str
+    content_type: str | None
+    size: int  # bytes
+    width: int | None  # images and videos only
+    height: int | None
+    url: str
+
+    @classmethod
+    def from_attachment(cls, attachment: discord.Attachment) -> "AttachmentData":
+        return cls(
+            attachment_id=attachment.id,
+            filename=attachment.filename,
+            content_type=attachment.content_type,
+            size=attachment.size,
+            width=attachment.width,
+            height=attachment.height,
+            url=attachment.url,
+        )
+
+
+@dataclass
+class EmbedData:
+    type: str | None  # rich, image, video, link...
+    url: str | None
+    title: str | None
+    provider: str | None  # site that generated the embed, e.g. YouTube
+
+    @classmethod
+    def from_embed(cls, embed: discord.Embed) -> "EmbedData":
+        return cls(
+            type=embed.type,
+            url=embed.url,
+            title=embed.title,
+            provider=embed.provider.name,
+        )
+
+
+@dataclass
+class StickerData:
+    sticker_id: int
+    name: str
+    format: str  # png, apng, lottie or gif
+
+    @classmethod
+    def from_sticker(cls, sticker: discord.StickerItem) -> "StickerData":
+        return cls(sticker_id=sticker.id, name=sticker.name, format=sticker.format.name)
 
 
 @dataclass
@@ -38,34 +137,183 @@ class MessageData:
     reply_to: int | None
     mentioned_ids: list[int]
     reactions: list[ReactionData]
+    attachments: list[AttachmentData] = field(default_factory=list)
+    embeds: list[EmbedData] = field(default_factory=list)
+    stickers: list[StickerData] = field(default_factory=list)
 
 
-async def index_messages(messages: list[discord.Message]):
-    # run async operations first
-    message_data: list[MessageData] = []
+@dataclass
+class ReactionEvent:
+    message_id: int
+    channel_id: int  # thread id for threads
+    user_id: int
+    emoji_id: int | None
+    emoji_unicode: str | None
+    action: Literal["add", "remove"]
+    timestamp: datetime
 
-    async def fetch_reaction_data(reaction: discord.Reaction) -> ReactionData | None:
-        emoji_id = None
-        emoji_unicode = None
+    @classmethod
+    def from_payload(
+        cls, payload: discord.RawReactionActionEvent, action: Literal["add", "remove"]
+    ) -> "ReactionEvent":
+        emoji_id = payload.emoji.id
+        return cls(
+            message_id=payload.message_id,
+            channel_id=payload.channel_id,
+            user_id=payload.user_id,
+            emoji_id=emoji_id,
+            emoji_unicode=payload.emoji.name if emoji_id is None else None,
+            action=action,
+            timestamp=discord.utils.utcnow(),
+        )
 
-        if isinstance(reaction.emoji, str):
-            # unicode emoji
-            emoji_unicode = cast(str, reaction.emoji)  # pyright: ignore[reportUnnecessaryCast]
-        else:
-            # custom emoji
-            emoji = cast(discord.PartialEmoji | discord.Emoji, reaction.emoji)  # pyright: ignore[reportUnnecessaryCast]
-            emoji_id = emoji.id
 
-            if emoji_id is None:
-                return None  # deleted custom emoji
+@dataclass
+class ReactionSnapshot:
+    """Every reaction on a message as of `synced_at`, users included."""
 
-        user_ids = [user.id async for user in reaction.users()]
-        return ReactionData(
-            emoji_id=emoji_id,
-            emoji_unicode=emoji_unicode,
-            users=user_ids,
+    message_id: int
+    reactions: list[ReactionData]
+    synced_at: datetime
+
+
+@dataclass
+class EditData:
+    message_id: int
+    content: str
+    mentioned_ids: list[int]
+    edited_at: datetime
+    # link previews are usually added in an edit after the message is sent.
+    # None leaves the indexed embeds as they are
+    embeds: list[EmbedData] | None = None
+
+    @classmethod
+    def from_message(cls, message: discord.Message) -> "EditData":
+        return cls(
+            message_id=message.id,
+            content=message.content,
+            mentioned_ids=[user.id for user in message.mentions],
+            edited_at=message.edited_at or discord.utils.utcnow(),
+            embeds=[EmbedData.from_embed(embed) for embed in message.embeds],
+        )
+
+
+@dataclass
+class DeleteData:
+    message_ids: list[int]
+    deleted_at: datetime
+
+    @classmethod
+    def from_payload(cls, payload: discord.RawMessageDeleteEvent) -> "DeleteData":
+        return cls(message_ids=[payload.message_id], deleted_at=discord.utils.utcnow())
+
+    @classmethod
+    def from_bulk_payload(
+        cls, payload: discord.RawBulkMessageDeleteEvent
+    ) -> "DeleteData":
+        return cls(
+            message_ids=sorted(payload.message_ids),
+            deleted_at=discord.utils.utcnow(),
         )
 
+
+@dataclass
+class CheckpointData:
+    channel_id: int
+    last_message_id: int
+    last_timestamp: datetime
+    complete: bool = False
+
+
+@dataclass
+class SearchQuery:
+    text: str
+    author_id: int | None = None
+    channel_id: int | None = None
+    thread_id: int | None = None
+    # snowflake bounds for the date range
+    after_id: int | None = None
+    before_id: int | None = None
+
+
+@dataclass
+class SearchResult:
+    message_id: int
+    author_id: int
+    channel_id: int
+    thread_id: int | None
+    content: str
+    timestamp: datetime
+
+    @property
+    def jump_url(self) -> str:
+        channel_id = self.thread_id or self.channel_id
+        return f"https://discord.com/channels/{Meta.SERVER.value}/{channel_id}/{self.message_id}"
+
+
+@dataclass
+class ActivitySummary:
+    messages: int
+    reactions: int
+    # (id, messages, reactions), ordered by messages
+    users: list[tuple[int, int, int]]
+    channels: list[tuple[int, int, int]]
+    hours: list[tuple[int, int, int]]  # hour of the day in UTC
+
+
+@dataclass
+class MediaSummary:
+    attachments: int
+    bytes: int
+    # (content type, attachments, bytes), ordered by attachments
+    content_types: list[tuple[str, int, int]]
+    # (name, uses), ordered by uses
+    stickers: list[tuple[str, int]]
+    providers: list[tuple[str, int]]  # link preview sites
+
+
+async def fetch_reaction_users(
+    reactions: list[tuple[discord.Reaction, ReactionData]],
+    concurrency: int = REACTION_FETCH_CONCURRENCY,
+    rate_limiter: RateLimiter | None = None,
+) -> None:
+    """Page through the users of many reactions with a bounded number of workers.
+
+    Every page is a request, so each one waits its turn on `rate_limiter` if
+    given.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(reaction: discord.Reaction, reaction_data: ReactionData):
+        async with semaphore:
+            users: list[int] = []
+            if rate_limiter:
+                await rate_limiter.acquire()
+
+            async for user in reaction.users():
+                users.append(user.id)
+                # the next user comes from a new page
+                if rate_limiter and len(users) % REACTION_USERS_PAGE_SIZE == 0:
+                    await rate_limiter.acquire()
+
+            reaction_data.users = users
+
+    await asyncio.gather(*(fetch(r, data) for r, data in reactions))
+
+
+async def collect_message_data(
+    messages: list[discord.Message],
+    reaction_users: bool = True,
+    rate_limiter: RateLimiter | None = None,
+) -> list[MessageData]:
+    """Convert messages to rows, fetching reaction users for the whole batch at once.
+
+    With `reaction_users` disabled only the aggregate count of each reaction is
+    recorded, which needs no extra requests.
+    """
+    message_data: list[MessageData] = []
+    pending_reactions: list[tuple[discord.Reaction, ReactionData]] = []
+
     for message in messages:
         # thread + channel logic
         if isinstance(message.channel, discord.Thread):
@@ -82,11 +330,15 @@ async def index_messages(messages: list[discord.Message]):
         )
         mentioned_ids = [user.id for user in message.mentions]
 
-        # collect reaction data asynchronously
-        reactions_raw = await asyncio.gather(
-            *map(fetch_reaction_data, message.reactions)
-        )
-        reactions_data = [r for r in reactions_raw if r is not None]
+        reactions_data: list[ReactionData] = []
+        for reaction in message.reactions:
+            reaction_data = ReactionData.from_reaction(reaction)
+            if reaction_data is None:
+                continue
+
+            reactions_data.append(reaction_data)
+            if reaction_users:
+                pending_reactions.append((reaction, reaction_data))
 
         message_data.append(
             MessageData(
@@ -100,112 +352,16 @@ async def index_messages(messages: list[discord.Message]):
                 reply_to=reply_id,
                 mentioned_ids=mentioned_ids,
                 reactions=reactions_data,
+                attachments=[
+                    AttachmentData.from_attachment(attachment)
+                    for attachment in message.attachments
+                ],
+                embeds=[EmbedData.from_embed(embed) for embed in message.embeds],
+                stickers=[
+                    StickerData.from_sticker(sticker) for sticker in message.stickers
+                ],
             )
         )
 
-    # do all database operations synchronously
-    with db_session:
-        msg_ids = [data.message_id for data in message_data]
-        existing_msgs = {
-            m.message_id for m in Message.select(lambda m: m.message_id in msg_ids)
-        }
-
-        for data in message_data:
-            try:
-                if data.message_id in existing_msgs:
-                    continue
-
-                db_msg = Message(
-                    message_id=data.message_id,
-                    author_id=data.author_id,
-                    is_bot=data.is_bot,
-                    channel_id=data.channel_id,
-                    thread_id=data.thread_id,
-                    content=data.content,
-                    timestamp=data.timestamp,
-                    reply_to=data.reply_to,
-                )
-
-                for uid in data.mentioned_ids:
-                    Mention(mentioned_user_id=uid, message=db_msg)
-
-                # load all reactions for the message
-                existing_reactions = {
-                    (r.user_id, r.emoji_id, r.emoji_unicode)
-                    for r in Reaction.select(lambda r: r.message == db_msg)
-                }
-
-                for reaction_data in data.reactions:
-                    for user_id in reaction_data.users:
-                        if (
-                            user_id,
-                            reaction_data.emoji_id,
-                            reaction_data.emoji_unicode,
-                        ) not in existing_reactions:
-                            Reaction(
-                                message=db_msg,
-                                user_id=user_id,
-                                emoji_id=reaction_data.emoji_id,
-                                emoji_unicode=reaction_data.emoji_unicode,
-                                # use the message timestamp for old reactions
-                                timestamp=data.timestamp,
-                            )
-            except Exception as e:
-                import traceback
-
-                print(f"Error while indexing messages: {e}")
-                traceback.print_exc()
-
-
-async def index_reaction(
-    message_id: int,
-    user_id: int,
-    emoji: discord.PartialEmoji,
-    action: Literal["add", "remove"],
-):
-    emoji_id = emoji.id
-    emoji_unicode = emoji.name if emoji_id is None else None
-    timestamp = discord.utils.utcnow()
-
-    with db_session:
-        msg = Message.get(message_id=message_id)
-        if not msg:
-            return  # message is not indexed, ignore reaction
-
-        if action == "add":
-            if not Reaction.exists(
-                message=msg,
-                user_id=user_id,
-                emoji_id=emoji_id,
-                emoji_unicode=emoji_unicode,
-            ):
-                Reaction(
-                    message=msg,
-                    user_id=user_id,
-                    emoji_id=emoji_id,
-                    emoji_unicode=emoji_unicode,
-                    timestamp=timestamp,
-                )
-        elif action == "remove":
-            r = Reaction.get(
-                message=msg,
-                user_id=user_id,
-                emoji_id=emoji_id,
-                emoji_unicode=emoji_unicode,
-            )
-            if r:
-                r.delete()
-
-
-async def index_edited_message(message: discord.Message):
-    with db_session:
-        db_msg = Message.get(message_id=message.id)
-        if not db_msg:
-            return  # message is not indexed, ignore edit
-
-        db_msg.content = message.content
-
-        # re-index mentions
-        Mention.select(lambda m: m.message == db_msg).delete(bulk=True)
-        for user in message.mentions:
-            Mention(mentioned_user_id=user.id, message=db_msg)
+    await fetch_reaction_users(pending_reactions, rate_limiter=rate_limiter)
+    return message_data
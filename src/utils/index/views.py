@@ -0,0 +1,125 @@
+from typing import override
+
+import discord
+
+from utils.index.database import search_messages
+from utils.index.pool import pool
+from utils.index.utils import SearchQuery, SearchResult
+
+PAGE_SIZE = 10
+
+
+def render_line(result: SearchResult) -> str:
+    content = discord.utils.escape_markdown(result.content.replace("\n", " "))
+    if len(content) > 120:
+        content = content[:117] + "..."
+
+    timestamp = discord.utils.format_dt(result.timestamp, style="d")
+    return f"{timestamp} <@{result.author_id}>: {content} [jump]({result.jump_url})"
+
+
+def render_results(
+    query: SearchQuery, results: list[SearchResult], page: int
+) -> discord.Embed:
+    # embed titles are limited to 256 characters
+    text = query.text
+    if len(text) > 200:
+        text = text[:197] + "..."
+
+    embed = discord.Embed(
+        title=f"Search results for '{text}'", color=discord.Color.blue()
+    )
+
+    if not results:
+        embed.description = "no messages found"
+        return embed
+
+    embed.description = "\n".join(map(render_line, results))
+    embed.set_footer(text=f"Page {page + 1}")
+    return embed
+
+
+def render_reply_chain(chain: list[tuple[int, SearchResult]]) -> discord.Embed:
+    embed = discord.Embed(title="Reply chain", color=discord.Color.blue())
+
+    if not chain:
+        embed.description = "that message isn't indexed"
+        return embed
+
+    lines: list[str] = []
+    for depth, result in chain:
+        line = render_line(result)
+        if depth == 0:
+            line = f"**→** {line}"
+        elif depth > 0:
+            line = f"{'↳' * min(depth, 5)} {line}"
+        lines.append(line)
+
+    # keep the embed under discord's description limit
+    description = ""
+    for line in lines:
+        if len(description) + len(line) + 1 > 4000:
+            break
+        description += line + "\n"
+
+    embed.description = description
+    return embed
+
+
+class SearchView(discord.ui.View):
+    """Keyset-paginated search results, only usable by whoever searched."""
+
+    def __init__(
+        self, user_id: int, query: SearchQuery, results: list[SearchResult]
+    ) -> None:
+        super().__init__(timeout=300)
+        self.user_id: int = user_id
+        self.query: SearchQuery = query
+        self.results: list[SearchResult] = results
+
+        # cursors of the pages before the current one
+        self.cursors: list[int | None] = []
+        self.cursor: int | None = None
+        self.update_buttons()
+
+    @property
+    def page(self) -> int:
+        return len(self.cursors)
+
+    def update_buttons(self) -> None:
+        self.previous_page.disabled = not self.cursors
+        self.next_page.disabled = len(self.results) < PAGE_SIZE
+
+    @override
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message(
+                "oops! only the person who searched can change pages.", ephemeral=True
+            )
+            return False
+
+        return True
+
+    async def show(self, interaction: discord.Interaction, cursor: int | None):
+        self.cursor = cursor
+        self.results = await pool.run(
+            search_messages, self.query, before_id=cursor, limit=PAGE_SIZE
+        )
+        self.update_buttons()
+
+        await interaction.response.edit_message(
+            embed=render_results(self.query, self.results, self.page), view=self
+        )
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(
+        self, interaction: discord.Interaction, _: discord.ui.Button["SearchView"]
+    ):
+        await self.show(interaction, self.cursors.pop())
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
+    async def next_page(
+        self, interaction: discord.Interaction, _: discord.ui.Button["SearchView"]
+    ):
+        self.cursors.append(self.cursor)
+        await self.show(interaction, self.results[-1].message_id)
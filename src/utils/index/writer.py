@@ -0,0 +1,362 @@
+import asyncio
+import time
+import traceback
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import psycopg2
+from psycopg2.extensions import connection as Connection
+from psycopg2.extensions import cursor as Cursor
+
+from utils.index.database import (
+    advance_checkpoints,
+    apply_edits,
+    apply_reaction,
+    insert_messages,
+    soft_delete_messages,
+    sync_reactions,
+    upsert_checkpoints,
+)
+from utils.index.pool import DatabasePool
+from utils.index.utils import (
+    CheckpointData,
+    DeleteData,
+    EditData,
+    MessageData,
+    ReactionEvent,
+    ReactionSnapshot,
+)
+
+# what a bad row can raise. psycopg2 raises ValueError for values it can't
+# send at all, like strings containing NUL bytes
+WRITE_ERRORS = (psycopg2.Error, ValueError)
+
+
+@dataclass
+class MessageBatch:
+    messages: list[MessageData]
+    # backfill progress, committed together with the messages
+    checkpoint: CheckpointData | None = None
+    # reaction events on these messages that arrived before they were indexed,
+    # replayed right after them
+    reactions: list[ReactionEvent] = field(default_factory=list)
+
+
+WriteOp = MessageBatch | ReactionEvent | ReactionSnapshot | EditData | DeleteData
+
+
+@dataclass
+class _QueueItem:
+    op: WriteOp
+    future: asyncio.Future[None]
+    urgent: bool
+
+
+@dataclass
+class CoalescedBatch:
+    messages: list[MessageData]
+    edits: list[EditData]
+    reactions: list[ReactionEvent]
+    snapshots: list[ReactionSnapshot]
+    deletes: list[DeleteData]
+    checkpoints: list[CheckpointData]
+
+    def write(self, cursor: Cursor) -> list[ReactionEvent]:
+        """Apply the batch and return the reaction events on unindexed messages."""
+        # runs inside the caller's transaction
+        if self.messages:
+            insert_messages(cursor, self.messages)
+            advance_checkpoints(cursor, self.messages)
+        if self.checkpoints:
+            upsert_checkpoints(cursor, self.checkpoints)
+        if self.edits:
+            apply_edits(cursor, self.edits)
+        if self.snapshots:
+            sync_reactions(cursor, self.snapshots)
+        unindexed = [e for e in self.reactions if not apply_reaction(cursor, e)]
+        if self.deletes:
+            soft_delete_messages(cursor, self.deletes)
+
+        return unindexed
+
+    @property
+    def writes(self) -> int:
+        return (
+            bool(self.messages)
+            + bool(self.checkpoints)
+            + bool(self.edits)
+            + bool(self.snapshots)
+            + bool(self.deletes)
+            + len(self.reactions)
+        )
+
+
+def coalesce(ops: list[WriteOp]) -> CoalescedBatch:
+    """Merge a batch of operations into the minimal set of writes.
+
+    All new messages are inserted together, as are all edits, which keep
+    their order so that the edit history sees every version. Reaction events
+    on the same (message, user, emoji) collapse into whichever action happened
+    last, and deletes are applied together at the end. Reaction snapshots keep
+    the latest per message and are applied before the live reaction events,
+    which are at least as recent. Replayed reaction events are older than any
+    live event in the batch, so they never override a live event on the same
+    reaction, wherever they are queued.
+    """
+    messages: list[MessageData] = []
+    checkpoints: list[CheckpointData] = []
+    edits: list[EditData] = []
+    deletes: list[DeleteData] = []
+    reactions: dict[tuple[int, int, int | None, str | None], ReactionEvent] = {}
+    live: set[tuple[int, int, int | None, str | None]] = set()
+    snapshots: dict[int, ReactionSnapshot] = {}
+
+    for op in ops:
+        if isinstance(op, MessageBatch):
+            messages.extend(op.messages)
+            if op.checkpoint:
+                checkpoints.append(op.checkpoint)
+            for event in op.reactions:
+                key = (
+                    event.message_id,
+                    event.user_id,
+                    event.emoji_id,
+                    event.emoji_unicode,
+                )
+                if key not in live:
+                    reactions.pop(key, None)
+                    reactions[key] = event
+        elif isinstance(op, ReactionEvent):
+            key = (op.message_id, op.user_id, op.emoji_id, op.emoji_unicode)
+            live.add(key)
+            reactions.pop(key, None)
+            reactions[key] = op
+        elif isinstance(op, ReactionSnapshot):
+            snapshots[op.message_id] = op
+        elif isinstance(op, EditData):
+            edits.append(op)
+        else:
+            deletes.append(op)
+
+    return CoalescedBatch(
+        messages=messages,
+        edits=edits,
+        deletes=deletes,
+        reactions=list(reactions.values()),
+        snapshots=list(snapshots.values()),
+        checkpoints=checkpoints,
+    )
+
+
+@dataclass
+class WriterStats:
+    queued: int = 0
+    max_queue: int = 0
+    enqueued: int = 0
+    written: int = 0
+    failed: int = 0
+    batches: int = 0
+    coalesced: int = 0
+    last_batch_size: int = 0
+    last_batch_seconds: float = 0.0
+    write_seconds: float = 0.0
+    backpressure_waits: int = 0
+    backpressure_seconds: float = 0.0
+
+
+class IndexWriter:
+    """Applies index writes on a dedicated thread, off the event loop.
+
+    Listeners enqueue operations with `submit`, which only waits when the queue
+    is full. A single worker collects operations for up to `max_delay` seconds
+    or `max_batch` operations, whichever comes first, and commits each batch in
+    one transaction on a connection borrowed from the pool.
+    """
+
+    def __init__(
+        self,
+        pool: DatabasePool,
+        max_queue: int = 10_000,
+        max_batch: int = 200,
+        max_delay: float = 0.25,
+    ) -> None:
+        self.pool: DatabasePool = pool
+        self.max_batch: int = max_batch
+        self.max_delay: float = max_delay
+        self.stats: WriterStats = WriterStats(max_queue=max_queue)
+
+        self._queue: asyncio.Queue[_QueueItem | None] = asyncio.Queue(maxsize=max_queue)
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="index-writer"
+        )
+        self._worker: asyncio.Task[None] | None = None
+        self._closed: bool = False
+
+        # called on the event loop with reaction events whose message isn't
+        # indexed, which are otherwise dropped
+        self.on_unindexed: Callable[[list[ReactionEvent]], None] | None = None
+
+    def start(self) -> None:
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def submit(self, op: WriteOp, urgent: bool = False) -> asyncio.Future[None]:
+        """Enqueue an operation and return a future resolved once it is committed.
+
+        Urgent operations are written as soon as the worker picks them up
+        instead of waiting for the batch window to fill.
+        """
+        if self._closed:
+            raise RuntimeError("Index writer is closed")
+
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        item = _QueueItem(op=op, future=future, urgent=urgent)
+
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # queue is full, wait for the worker to catch up
+            self.stats.backpressure_waits += 1
+            start = time.perf_counter()
+            await self._queue.put(item)
+            self.stats.backpressure_seconds += time.perf_counter() - start
+
+        self.stats.enqueued += 1
+        self.stats.queued = self._queue.qsize()
+        return future
+
+    async def write(self, op: WriteOp) -> None:
+        """Enqueue an operation and wait until it is committed."""
+        await (await self.submit(op, urgent=True))
+
+    async def close(self) -> None:
+        """Stop accepting operations and flush everything still queued."""
+        if self._closed:
+            return
+
+        self._closed = True
+        if self._worker is not None:
+            await self._queue.put(None)
+            await self._worker
+
+        self._executor.shutdown(wait=True)
+
+    def discard(self) -> None:
+        """Stop accepting operations and drop everything queued without writing it.
+
+        For a writer that will never start. Draining the queue also frees any
+        listener waiting for room in it.
+        """
+        self._closed = True
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None and not item.future.done():
+                item.future.set_exception(RuntimeError("Index writer is closed"))
+                item.future.exception()
+
+        self.stats.queued = 0
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+
+            # linger to coalesce events into one transaction, unless someone is
+            # waiting on the commit or the writer is shutting down
+            batch = [item]
+            deadline = loop.time() + self.max_delay
+            urgent = item.urgent
+
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                try:
+                    if urgent or self._closed or timeout <= 0:
+                        next_item = self._queue.get_nowait()
+                    else:
+                        next_item = await asyncio.wait_for(self._queue.get(), timeout)
+                except (asyncio.QueueEmpty, TimeoutError):
+                    break
+
+                if next_item is None:
+                    stopping = True
+                    break
+
+                batch.append(next_item)
+                urgent = urgent or next_item.urgent
+
+            self.stats.queued = self._queue.qsize()
+
+            start = time.perf_counter()
+            try:
+                async with self.pool.connection() as conn:
+                    errors, unindexed = await loop.run_in_executor(
+                        self._executor,
+                        self._write_batch,
+                        conn,
+                        [item.op for item in batch],
+                    )
+            except Exception as e:
+                # couldn't get a connection at all, or a bug in the write path.
+                # either way fail this batch and keep the worker alive, or
+                # nothing queued after it would ever be written
+                print(f"Error while writing to the index: {e}")
+                traceback.print_exc()
+                errors, unindexed = [e] * len(batch), []
+            elapsed = time.perf_counter() - start
+
+            self.stats.batches += 1
+            self.stats.last_batch_size = len(batch)
+            self.stats.last_batch_seconds = elapsed
+            self.stats.write_seconds += elapsed
+
+            for item, error in zip(batch, errors):
+                future = item.future
+                if error is None:
+                    self.stats.written += 1
+                    if not future.done():
+                        future.set_result(None)
+                else:
+                    self.stats.failed += 1
+                    if not future.done():
+                        future.set_exception(error)
+
+                    # live listeners never await their futures
+                    future.exception()
+
+            if unindexed and self.on_unindexed:
+                self.on_unindexed(unindexed)
+
+    def _write_batch(
+        self, conn: Connection, ops: list[WriteOp]
+    ) -> tuple[list[Exception | None], list[ReactionEvent]]:
+        # runs on the writer thread
+        try:
+            batch = coalesce(ops)
+            with conn, conn.cursor() as cursor:
+                unindexed = batch.write(cursor)
+
+            self.stats.coalesced += len(ops) - batch.writes
+            return [None] * len(ops), unindexed
+        except WRITE_ERRORS as e:
+            print(f"Error while writing a batch of {len(ops)}, retrying each: {e}")
+
+        # the batch was rolled back, retry each operation on its own so a
+        # single bad row doesn't drop the rest
+        errors: list[Exception | None] = []
+        unindexed: list[ReactionEvent] = []
+        for op in ops:
+            try:
+                with conn, conn.cursor() as cursor:
+                    unindexed += coalesce([op]).write(cursor)
+                errors.append(None)
+            except WRITE_ERRORS as e:
+                print(f"Error while writing to the index: {e}")
+                traceback.print_exc()
+                errors.append(e)
+
+        return errors, unindexed
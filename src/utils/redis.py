@@ -2,22 +2,148 @@
 # pyright: reportDeprecated=false
 
 import os
+import time
 from collections.abc import Awaitable
-from typing import Set, cast
+from dataclasses import dataclass
+from typing import Any, Set, cast
 
 import redis.asyncio as redis
+from redis.commands.core import AsyncScript
+
+REDIS_POOL_SIZE = int(os.getenv("REDIS_POOL_SIZE", default="16"))
+# seconds to wait for a free connection before giving up
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", default="5"))
+
+# keys per MGET or pipeline, so that huge loads don't block the server or build
+# one giant reply
+MGET_CHUNK_SIZE = 500
+
+# field updates that must not recreate a hash deleted in the meantime
+HSET_IF_EXISTS = """
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    return 0
+end
+redis.call("HSET", KEYS[1], unpack(ARGV))
+return 1
+"""
+HINCRBY_IF_EXISTS = """
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    return false
+end
+return redis.call("HINCRBY", KEYS[1], ARGV[1], ARGV[2])
+"""
+
+
+def redis_url() -> str:
+    # check if running locally and use the appropriate Redis URL
+    if os.getenv("ENVIRONMENT") == "local":
+        return cast(str, os.getenv("REDIS_URL_LOCAL"))
+
+    return cast(str, os.getenv("REDIS_URL"))
+
+
+@dataclass
+class RedisPoolStats:
+    max_size: int = 0
+    in_use: int = 0
+    idle: int = 0
+    waiting: int = 0
+    acquired: int = 0
+    # acquisitions that found every connection in use
+    waits: int = 0
+    wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+
+    @property
+    def saturation(self) -> float:
+        return self.in_use / self.max_size if self.max_size else 0.0
+
+
+class MeteredConnectionPool(redis.BlockingConnectionPool):
+    """A blocking connection pool that keeps track of how busy it is."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.stats: RedisPoolStats = RedisPoolStats(max_size=self.max_connections)
+
+    async def get_connection(self, *args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        if len(self._in_use_connections) >= self.max_connections:
+            self.stats.waits += 1
+
+        self.stats.waiting += 1
+        try:
+            connection = await super().get_connection(*args, **kwargs)
+        finally:
+            self.stats.waiting -= 1
+
+        waited = time.perf_counter() - start
+        self.stats.acquired += 1
+        self.stats.wait_seconds += waited
+        self.stats.max_wait_seconds = max(self.stats.max_wait_seconds, waited)
+        return connection
+
+    def snapshot(self) -> RedisPoolStats:
+        self.stats.in_use = len(self._in_use_connections)
+        self.stats.idle = len(self._available_connections)
+        return self.stats
+
+
+# one pool and client for the whole process, connected lazily
+_pool: MeteredConnectionPool | None = None
+_client: redis.Redis | None = None
+_managers: int = 0
+
+
+def get_redis() -> redis.Redis:
+    """The process-wide Redis client, backed by the shared connection pool."""
+    global _pool, _client
+
+    if _client is None:
+        _pool = MeteredConnectionPool.from_url(
+            redis_url(),
+            max_connections=REDIS_POOL_SIZE,
+            timeout=REDIS_POOL_TIMEOUT,
+            decode_responses=True,
+        )
+        _client = redis.Redis(connection_pool=_pool)
+
+    return _client
+
+
+def redis_pool_stats() -> RedisPoolStats:
+    if _pool is None:
+        return RedisPoolStats(max_size=REDIS_POOL_SIZE)
+
+    return _pool.snapshot()
+
+
+async def close_redis() -> None:
+    """Disconnect the shared pool, the next `get_redis` starts a new one."""
+    global _pool, _client
+
+    if _pool is not None:
+        await _pool.disconnect()
+        print("Redis connection pool closed")
+
+    _pool = None
+    _client = None
 
 
 class RedisManager:
-    def __init__(self, key_prefix: str) -> None:
-        # check if running locally and use the appropriate Redis URL
-        is_local = os.getenv("ENVIRONMENT") == "local"
-        if is_local:
-            self.redis_url: str = cast(str, os.getenv("REDIS_URL_LOCAL"))
-        else:
-            self.redis_url = cast(str, os.getenv("REDIS_URL"))
+    """Key-prefixed access to the shared Redis client.
+
+    Every manager borrows connections from the same pool. `close` only
+    disconnects the pool once the last connected manager is closed.
+    """
 
+    def __init__(self, key_prefix: str) -> None:
+        self.redis_url: str = redis_url()
         self.redis: redis.Redis | None = None
+        # registered once per client on connect, scripts load themselves on
+        # first use
+        self._hset_if_exists: AsyncScript | None = None
+        self._hincrby_if_exists: AsyncScript | None = None
 
         self.key_prefix: str = key_prefix
         self.set_key: str = f"all_{key_prefix}"
@@ -29,23 +155,36 @@ class RedisManager:
         return f"{self.set_key}:{key}"
 
     async def connect(self) -> None:
+        global _managers
+
+        if self.redis:
+            return
+
         try:
-            self.redis = redis.from_url(self.redis_url, decode_responses=True)
+            client = get_redis()
 
             # test connection
-            if self.redis:
-                await self.redis.ping()
-                print(f"Successfully connected to Redis at {self.redis_url}")
-            else:
-                raise redis.ConnectionError("Failed to initialize Redis client")
+            await client.ping()
+            print(f"Successfully connected to Redis at {self.redis_url}")
         except redis.ConnectionError as e:
             print(f"Failed to connect to Redis at {self.redis_url}: {e}")
             raise
 
+        self.redis = client
+        self._hset_if_exists = client.register_script(HSET_IF_EXISTS)
+        self._hincrby_if_exists = client.register_script(HINCRBY_IF_EXISTS)
+        _managers += 1
+
     async def close(self) -> None:
+        global _managers
+
         if self.redis:
-            await self.redis.close()
-            print("Redis connection closed")
+            self.redis = None
+            self._hset_if_exists = None
+            self._hincrby_if_exists = None
+            _managers -= 1
+            if _managers == 0:
+                await close_redis()
 
     async def get(self, key: str) -> str | None:
         if not self.redis:
@@ -61,6 +200,22 @@ class RedisManager:
         prefixed_key = self.get_key(key)
         return await cast(Awaitable[bool], self.redis.set(prefixed_key, value, ex=ex))
 
+    async def mget(
+        self, keys: list[str], chunk_size: int = MGET_CHUNK_SIZE
+    ) -> list[str | None]:
+        """Get many keys in one round trip per `chunk_size` keys, in order."""
+        if not self.redis:
+            raise redis.ConnectionError("Redis client not initialized")
+
+        values: list[str | None] = []
+        for start in range(0, len(keys), chunk_size):
+            chunk = [self.get_key(key) for key in keys[start : start + chunk_size]]
+            values.extend(
+                await cast(Awaitable[list[str | None]], self.redis.mget(chunk))
+            )
+
+        return values
+
     async def delete(self, key: str) -> int:
         if not self.redis:
             raise redis.ConnectionError("Redis client not initialized")
@@ -76,6 +231,93 @@ class RedisManager:
         result = await cast(Awaitable[int], self.redis.exists(prefixed_key))
         return bool(result)
 
+    # hash operations
+    async def hgetall(self, key: str) -> dict[str, str]:
+        if not self.redis:
+            raise redis.ConnectionError("Redis client not initialized")
+
+        prefixed_key = self.get_key(key)
+        return await cast(Awaitable[dict[str, str]], self.redis.hgetall(prefixed_key))
+
+    async def hgetall_many(
+        self, keys: list[str], chunk_size: int = MGET_CHUNK_SIZE
+    ) -> list[dict[str, str]]:
+        """HGETALL many keys, pipelined in chunks of `chunk_size`, in order."""
+        if not self.redis:
+            raise redis.ConnectionError("Redis client not initialized")
+
+        values: list[dict[str, str]] = []
+        for start in range(0, len(keys), chunk_size):
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key in keys[start : start + chunk_size]:
+                    pipe.hgetall(self.get_key(key))
+                values.extend(await pipe.execute())
+
+        return values
+
+    async def hset(self, key: str, mapping: dict[str, str]) -> int:
+        if not self.redis:
+            raise redis.ConnectionError("Redis client not initialized")
+
+        prefixed_key = self.get_key(key)
+        return await cast(
+            Awaitable[int],
+            self.redis.hset(prefixed_key, mapping=mapping),  # pyright: ignore[reportArgumentType]
+        )
+
+    async def hset_existing(self, key: str, mapping: dict[str, str]) -> bool:
+        """Set fields of a hash, but only if the hash exists."""
+        if not self._hset_if_exists:
+            raise redis.ConnectionError("Redis client not initialized")
+
+        prefixed_key = self.get_key(key)
+        fields = [item for pair in mapping.items() for item in pair]
+        return bool(await self._hset_if_exists(keys=[prefixed_key], args=fields))
+
+    async def hincrby_existing_many(self, field: str, amounts: dict[str, int]) -> None:
+        """Increment one field of many hashes that exist, in one transaction."""
+        if not self.redis or not self._hincrby_if_exists:
+            raise redis.ConnectionError("Redis client not initialized")
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for key, amount in amounts.items():
+                await self._hincrby_if_exists(
+                    keys=[self.get_key(key)], args=[field, amount], client=pipe
+                )
+            await pipe.execute()
+
+    # sorted set operations
+    async def zincrby(self, key: str, amount: float, member: str) -> float:
+        if not self.redis:
+            raise redis.ConnectionError("Redis client not initialized")
+
+        prefixed_key = self.get_key(key)
+        return await cast(
+            Awaitable[float], self.redis.zincrby(prefixed_key, amount, member)
+        )
+
+    async def zscore(self, key: str, member: str) -> float | None:
+        if not self.redis:
+            raise redis.ConnectionError("Redis client not initialized")
+
+        prefixed_key = self.get_key(key)
+        return await cast(
+            Awaitable[float | None], self.redis.zscore(prefixed_key, member)
+        )
+
+    async def zrevrange(
+        self, key: str, start: int, stop: int
+    ) -> list[tuple[str, float]]:
+        """Members ranked `start` to `stop` inclusive, highest score first."""
+        if not self.redis:
+            raise redis.ConnectionError("Redis client not initialized")
+
+        prefixed_key = self.get_key(key)
+        return await cast(
+            Awaitable[list[tuple[str, float]]],
+            self.redis.zrevrange(prefixed_key, start, stop, withscores=True),
+        )
+
     # set operations
     async def sadd(self, key: str, value: str) -> int:
         if not self.redis:
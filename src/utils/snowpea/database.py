@@ -1,9 +1,13 @@
 import time
 
+import redis.asyncio as redis
+
 from utils.redis import RedisManager
 
 SNOWPEA_COOLDOWN_SECONDS = 30
 
+STAT_TYPES = ("received", "initiated")
+
 
 class SnowpeaDatabase(RedisManager):
     def __init__(self) -> None:
@@ -38,66 +42,70 @@ class SnowpeaDatabase(RedisManager):
             pass
         return False
 
-    async def increment_received_count(self, user_id: int) -> int:
-        key = f"received:{user_id}"
-        current_count = await self.get(key)
-        count = 1
-
-        if current_count:
-            try:
-                count = int(current_count) + 1
-            except ValueError:
-                count = 1
+    async def migrate_counts(self) -> int:
+        """Move the per-user count keys into the leaderboard sorted sets, once.
 
-        # update the count
-        await self.set(key, str(count))
-        await self.sadd("received_users", str(user_id))
+        Counts are added rather than set, so increments made before the
+        migration ran are kept, and the marker is written in the same
+        transaction so that it never runs twice. The old keys are left in
+        place. Returns the number of migrated counts.
+        """
+        if not self.redis:
+            raise redis.ConnectionError("Redis client not initialized")
 
-        return count
+        marker = self.get_key("leaderboard:migrated")
+        migrated = 0
 
-    async def increment_initiated_count(self, user_id: int) -> int:
-        key = f"initiated:{user_id}"
-        current_count = await self.get(key)
-        count = 1
+        async with self.redis.pipeline(transaction=True) as pipe:
+            await pipe.watch(marker)
+            if await pipe.exists(marker):
+                return 0
 
-        if current_count:
-            try:
-                count = int(current_count) + 1
-            except ValueError:
-                count = 1
+            counts: dict[str, list[tuple[str, int]]] = {}
+            for stat in STAT_TYPES:
+                user_ids = sorted(await self.smembers(f"{stat}_users"))
+                values = await self.mget([f"{stat}:{user_id}" for user_id in user_ids])
+                counts[stat] = [
+                    (user_id, int(value))
+                    for user_id, value in zip(user_ids, values)
+                    if value and value.isdigit() and int(value) > 0
+                ]
+
+            pipe.multi()
+            for stat, user_counts in counts.items():
+                for user_id, count in user_counts:
+                    pipe.zincrby(self.get_key(f"leaderboard:{stat}"), count, user_id)
+                    migrated += 1
+            pipe.set(marker, str(int(time.time())))
+            await pipe.execute()
+
+        return migrated
+
+    async def _increment(self, stat_type: str, user_id: int) -> int:
+        return int(await self.zincrby(f"leaderboard:{stat_type}", 1, str(user_id)))
+
+    async def _get_count(self, stat_type: str, user_id: int) -> int:
+        score = await self.zscore(f"leaderboard:{stat_type}", str(user_id))
+        return int(score) if score else 0
 
-        # update the count
-        await self.set(key, str(count))
-        await self.sadd("initiated_users", str(user_id))
+    async def increment_received_count(self, user_id: int) -> int:
+        return await self._increment("received", user_id)
 
-        return count
+    async def increment_initiated_count(self, user_id: int) -> int:
+        return await self._increment("initiated", user_id)
 
     async def get_received_count(self, user_id: int) -> int:
-        key = f"received:{user_id}"
-        count = await self.get(key)
-
-        if count:
-            try:
-                return int(count)
-            except ValueError:
-                return 0
-        return 0
+        return await self._get_count("received", user_id)
 
     async def get_initiated_count(self, user_id: int) -> int:
-        key = f"initiated:{user_id}"
-        count = await self.get(key)
-
-        if count:
-            try:
-                return int(count)
-            except ValueError:
-                return 0
-        return 0
+        return await self._get_count("initiated", user_id)
 
-    async def get_users_with_stats(self, stat_type: str) -> set[str]:
-        if stat_type.lower() == "received":
-            return await self.smembers("received_users")
-        elif stat_type.lower() == "initiated":
-            return await self.smembers("initiated_users")
+    async def get_leaderboard(
+        self, stat_type: str, start: int, stop: int
+    ) -> list[tuple[int, int]]:
+        """(user id, count) ranked `start` to `stop` inclusive, highest first."""
+        if stat_type.lower() not in STAT_TYPES:
+            return []
 
-        return set()
+        ranking = await self.zrevrange(f"leaderboard:{stat_type.lower()}", start, stop)
+        return [(int(user_id), int(score)) for user_id, score in ranking]
@@ -3,6 +3,8 @@
 import json
 from typing import TYPE_CHECKING
 
+import redis.asyncio as redis
+
 from utils.redis import RedisManager
 
 if TYPE_CHECKING:
@@ -10,47 +12,100 @@ if TYPE_CHECKING:
 
 
 class TagDatabase(RedisManager):
-    def __init__(self) -> None:
-        super().__init__(key_prefix="tag")
+    """Tags stored as one hash per tag, so fields can be updated on their own."""
+
+    def __init__(self, key_prefix: str = "tag") -> None:
+        super().__init__(key_prefix=key_prefix)
+
+    async def migrate_json_tags(self) -> int:
+        """Convert tags still stored as JSON strings to hashes, in place.
+
+        Each tag is converted in its own transaction, so a tag edited during
+        the migration is retried rather than overwritten. Returns the number of
+        converted tags.
+        """
+        from utils.tags.models import TagData
+
+        if not self.redis:
+            raise redis.ConnectionError("Redis client not initialized")
+
+        names = sorted(await self.smembers(""))
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for name in names:
+                pipe.type(self.get_key(name))
+            types: list[str] = await pipe.execute()
+
+        converted = 0
+        for name, key_type in zip(names, types):
+            if key_type != "string":
+                continue
+
+            key = self.get_key(name)
+            async with self.redis.pipeline(transaction=True) as pipe:
+                while True:
+                    try:
+                        await pipe.watch(key)
+                        tag_json = await pipe.get(key)
+                        if tag_json is None:
+                            break  # deleted in the meantime
+
+                        tag = TagData.from_dict(json.loads(tag_json))
+                        pipe.multi()
+                        pipe.delete(key)
+                        pipe.hset(key, mapping=tag.to_hash())  # pyright: ignore[reportArgumentType]
+                        await pipe.execute()
+                        converted += 1
+                        break
+                    except redis.WatchError:
+                        continue
+
+        return converted
 
     async def get_all_tags(self) -> dict[str, "TagData"]:
         from utils.tags.models import TagData
 
         tags: dict[str, TagData] = {}
-        tag_names = await self.smembers("")
+        tag_names = sorted(await self.smembers(""))
 
-        # get each tag's data
-        for name in tag_names:
-            tag_json = await self.get(name)
-            if tag_json:
-                tag_dict = json.loads(tag_json)
-                tags[name] = TagData.from_dict(tag_dict)
+        # get every tag's data in a few round trips
+        for name, tag_hash in zip(tag_names, await self.hgetall_many(tag_names)):
+            if tag_hash:
+                tags[name] = TagData.from_dict(dict(tag_hash))
 
         return tags
 
     async def get_tag(self, name: str) -> "TagData | None":
         from utils.tags.models import TagData
 
-        tag_json = await self.get(name)
-        if tag_json:
-            tag_dict = json.loads(tag_json)
-            return TagData.from_dict(tag_dict)
+        tag_hash = await self.hgetall(name)
+        if tag_hash:
+            return TagData.from_dict(dict(tag_hash))
 
         return None
 
     async def add_tag(self, tag: "TagData") -> bool:
-        # add the tag name to the set of all tags
-        await self.sadd("", tag.name)
+        if not self.redis:
+            raise redis.ConnectionError("Redis client not initialized")
 
-        return await self.set(tag.name, tag.to_json())
+        key = self.get_key(tag.name)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            # add the tag name to the set of all tags
+            pipe.sadd(self.get_set_key(""), tag.name)
+            pipe.delete(key)
+            pipe.hset(key, mapping=tag.to_hash())  # pyright: ignore[reportArgumentType]
+            await pipe.execute()
 
-    async def update_tag(self, tag: "TagData") -> bool:
-        exists = await self.exists(tag.name)
-        if not exists:
-            return False
+        return True
+
+    async def set_content(self, name: str, content: str) -> bool:
+        return await self.hset_existing(name, {"content": content})
+
+    async def set_starred(self, name: str, starred: bool) -> bool:
+        return await self.hset_existing(name, {"starred": str(int(starred))})
 
-        # update the tag data
-        return await self.set(tag.name, tag.to_json())
+    async def add_uses(self, uses: dict[str, int]) -> None:
+        """Add to the use counts of many tags at once."""
+        await self.hincrby_existing_many("uses", uses)
 
     async def delete_tag(self, name: str) -> bool:
         exists = await self.exists(name)
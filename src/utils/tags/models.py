@@ -9,6 +9,11 @@ def get_int(value: object, default: int = 0) -> int:
     return int(value) if isinstance(value, (int, str)) else default
 
 
+def get_bool(value: object) -> bool:
+    # hashes store flags as "1" and "0"
+    return value is True or value == "1"
+
+
 @dataclass
 class TagData:
     name: str
@@ -35,7 +40,7 @@ class TagData:
             author_id=get_int(data["author_id"]),
             author_name=str(data["author_name"]),
             created_at=datetime.datetime.fromisoformat(str(data["created_at"])),
-            starred=bool(data.get("starred", False)),
+            starred=get_bool(data.get("starred", False)),
             uses=get_int(data["uses"]),
             message_id=get_int(data["message_id"]),
             channel_id=get_int(data["channel_id"]),
@@ -56,3 +61,10 @@ class TagData:
 
     def to_json(self) -> str:
         return json.dumps(self.to_dict())
+
+    def to_hash(self) -> dict[str, str]:
+        """Fields for storing the tag as a Redis hash, which only holds strings."""
+        return {
+            key: str(int(value)) if isinstance(value, bool) else str(value)
+            for key, value in self.to_dict().items()
+        }
@@ -0,0 +1,79 @@
+import asyncio
+import contextlib
+from collections import Counter
+
+import redis.asyncio as redis
+
+from utils.tags.database import TagDatabase
+
+# seconds between flushes of buffered tag uses
+FLUSH_INTERVAL = 30
+
+
+class TagUsageBuffer:
+    """Write-behind buffer for tag use counts.
+
+    Uses are counted in memory and added to Redis in one transaction every
+    `FLUSH_INTERVAL` seconds, so displaying a tag never waits on Redis. A
+    failed flush keeps its counts for the next one, and closing the buffer
+    flushes whatever is left.
+    """
+
+    def __init__(self, db: TagDatabase, interval: float = FLUSH_INTERVAL) -> None:
+        self.db: TagDatabase = db
+        self.interval: float = interval
+        self.flushed: int = 0
+
+        self._pending: Counter[str] = Counter()
+        self._lock: asyncio.Lock = asyncio.Lock()
+        self._stopping: asyncio.Event = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending.total()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def record(self, name: str) -> None:
+        self._pending[name] += 1
+
+    def discard(self, name: str) -> None:
+        """Drop buffered uses of a deleted tag."""
+        self._pending.pop(name, None)
+
+    async def flush(self) -> None:
+        async with self._lock:
+            if not self._pending:
+                return
+
+            uses, self._pending = self._pending, Counter()
+            try:
+                await self.db.add_uses(dict(uses))
+                self.flushed += uses.total()
+            except Exception:
+                # keep the counts for the next flush
+                self._pending.update(uses)
+                raise
+
+    async def close(self) -> None:
+        # let a flush in progress finish instead of cancelling it halfway,
+        # which would lose the counts it had taken
+        self._stopping.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+        await self.flush()
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._stopping.wait(), self.interval)
+
+            try:
+                await self.flush()
+            except redis.RedisError as e:
+                print(f"Error flushing tag usage counts: {e}")